@@ -0,0 +1,4 @@
+""" ZIP2PDF benchmarks
+    Reproducible, offline benchmarks of extraction, saving members to disk,
+    img2pdf conversion and PDF merging on generated data.
+    Run from the repository root with 'python -m benchmarks.run'."""
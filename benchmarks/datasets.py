@@ -0,0 +1,216 @@
+""" ZIP2PDF benchmark data
+    Generates the synthetic archives, images and PDFs the benchmarks run on.
+    Everything comes from a fixed seed, so the same scale always gives the
+    same files. The data is written once per scale and reused by later runs."""
+
+# required modules
+import io
+import json
+import os
+import random
+import shutil
+import tarfile
+import zipfile
+
+# Bump when the generated data changes, so old data is regenerated
+DATASET_VERSION = 1
+
+SEED = 2021
+
+# Archive shapes at scale 1: (member count, member size in bytes)
+ARCHIVE_SHAPES = {
+    'small': (4000, 8 * 1024),
+    'huge': (3, 48 * 1024 * 1024),
+}
+ARCHIVE_FORMATS = ('zip', 'tar', '7z')
+
+# Scanned pages at scale 1: page count and pixel size (A4 at 150 dpi)
+IMAGE_COUNT = 60
+IMAGE_SIZE = (1240, 1754)
+IMAGE_JPEG_QUALITY = 85
+
+# PDFs to merge at scale 1, each holding PAGES_PER_PDF of the images
+PDF_COUNT = 20
+PAGES_PER_PDF = 5
+
+# Member data alternates random bytes and repeated text, which compresses about 2:1
+RANDOM_BLOCK_SIZE = 1024 * 1024
+TEXT_BLOCK = 'ZIP2PDF ベンチマーク '.encode('utf-8') * 64
+
+# Members are grouped into folders of this many files
+MEMBERS_PER_FOLDER = 100
+
+
+class _CodepageZipInfo(zipfile.ZipInfo):
+    """
+    ZipInfo that stores its name in cp932 without the UTF-8 flag, the way
+    archivers on Japanese Windows do. zipfile has no public option for this.
+    """
+
+    def _encodeFilenameFlags(self):
+        return self.filename.encode('cp932'), self.flag_bits
+
+
+def member_name(index):
+    """
+    Shift-JIS friendly name of one member, e.g. '第001巻/ページ00042.bin'
+    """
+    return '第{:03d}巻/ページ{:05d}.bin'.format(index // MEMBERS_PER_FOLDER, index)
+
+
+def member_data(random_block, index, size):
+    """
+    Deterministic content of one member
+    """
+    span = len(random_block) - len(TEXT_BLOCK)
+    offset = (index * 7919) % span
+    data = bytearray()
+    while len(data) < size:
+        data += random_block[offset:offset + len(TEXT_BLOCK)]
+        data += TEXT_BLOCK
+        offset = (offset + 4099) % span
+    return bytes(data[:size])
+
+
+def scaled(value, scale):
+    """
+    value multiplied by scale, at least 1
+    """
+    return max(1, int(value * scale))
+
+
+def write_zip(path, members):
+    """
+    Writes (name, data) members to a deflated .zip with cp932 names
+    """
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members:
+            info = _CodepageZipInfo(name, date_time=(2021, 1, 1, 0, 0, 0))
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, data)
+
+
+def write_tar(path, members):
+    """
+    Writes (name, data) members to an uncompressed GNU .tar with cp932 names
+    """
+    with tarfile.open(path, 'w', format=tarfile.GNU_FORMAT, encoding='cp932') as archive:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = 1609459200
+            archive.addfile(info, io.BytesIO(data))
+
+
+def write_7z(path, members, staging_dir):
+    """
+    Writes (name, data) members to a .7z. py7zr only adds files from disk, so they are staged first.
+    """
+    import py7zr
+
+    os.makedirs(staging_dir)
+    try:
+        with py7zr.SevenZipFile(path, 'w') as archive:
+            for index, (name, data) in enumerate(members):
+                staged_path = os.path.join(staging_dir, str(index))
+                with open(staged_path, 'wb') as staged_file:
+                    staged_file.write(data)
+                archive.write(staged_path, name)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+def make_archives(data_dir, scale, rng):
+    """
+    Writes every format in every shape and returns their dataset entries
+    """
+    random_block = rng.getrandbits(8 * RANDOM_BLOCK_SIZE).to_bytes(RANDOM_BLOCK_SIZE, 'little')
+    datasets = {}
+    for shape, (count, size) in ARCHIVE_SHAPES.items():
+        count = scaled(count, scale) if shape == 'small' else count
+        size = size if shape == 'small' else scaled(size, scale)
+        for archive_format in ARCHIVE_FORMATS:
+            name = '{}-{}'.format(archive_format, shape)
+            path = os.path.join(data_dir, name + '.' + archive_format)
+            # Generated lazily, so a huge archive never holds more than one member in memory
+            members = ((member_name(index), member_data(random_block, index, size)) for index in range(count))
+            if archive_format == 'zip':
+                write_zip(path, members)
+            elif archive_format == 'tar':
+                write_tar(path, members)
+            else:
+                write_7z(path, members, os.path.join(data_dir, 'staging'))
+            datasets[name] = {'path': path, 'items': count, 'bytes': count * size}
+    return datasets
+
+
+def make_images(data_dir, scale, rng):
+    """
+    Writes noisy tinted JPEG pages, which compress about like real scans
+    """
+    from PIL import Image
+
+    image_dir = os.path.join(data_dir, 'images')
+    os.makedirs(image_dir)
+    paths = []
+    for index in range(scaled(IMAGE_COUNT, scale)):
+        # Noise drawn at a quarter of the size and scaled up, like paper grain and print
+        noise_size = (IMAGE_SIZE[0] // 4, IMAGE_SIZE[1] // 4)
+        noise_bytes = rng.getrandbits(8 * noise_size[0] * noise_size[1]).to_bytes(noise_size[0] * noise_size[1],
+                                                                                   'little')
+        noise = Image.frombytes('L', noise_size, noise_bytes).resize(IMAGE_SIZE, Image.BILINEAR)
+        tint = Image.new('RGB', IMAGE_SIZE, (rng.randrange(200, 256), rng.randrange(200, 256), 230))
+        page = Image.merge('RGB', [Image.blend(channel, noise, 0.5) for channel in tint.split()])
+        path = os.path.join(image_dir, 'page{:04d}.jpg'.format(index))
+        page.save(path, 'JPEG', quality=IMAGE_JPEG_QUALITY, dpi=(150, 150))
+        paths.append(path)
+    return {'paths': paths, 'items': len(paths), 'bytes': sum(os.path.getsize(path) for path in paths)}
+
+
+def make_pdfs(data_dir, images, scale):
+    """
+    Writes PDFs of a few pages each, made from the images
+    """
+    import img2pdf
+
+    pdf_dir = os.path.join(data_dir, 'pdfs')
+    os.makedirs(pdf_dir)
+    image_paths = images['paths']
+    paths = []
+    for index in range(scaled(PDF_COUNT, scale)):
+        start = (index * PAGES_PER_PDF) % len(image_paths)
+        pages = [image_paths[(start + offset) % len(image_paths)] for offset in range(PAGES_PER_PDF)]
+        path = os.path.join(pdf_dir, 'part{:03d}.pdf'.format(index))
+        with open(path, 'wb') as pdf_file:
+            img2pdf.convert(pages, outputstream=pdf_file)
+        paths.append(path)
+    return {'paths': paths, 'items': len(paths) * PAGES_PER_PDF,
+            'bytes': sum(os.path.getsize(path) for path in paths)}
+
+
+def ensure_datasets(data_dir, scale=1.0):
+    """
+    Returns the datasets for this scale, generating them first when data_dir does not hold them yet.
+    The result maps dataset names to {'path' or 'paths', 'items', 'bytes'}.
+    """
+    data_dir = os.path.join(data_dir, 'scale-{:g}'.format(scale))
+    manifest_path = os.path.join(data_dir, 'datasets.json')
+    try:
+        with open(manifest_path, encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest.get('version') == DATASET_VERSION:
+            return manifest['datasets']
+    except (OSError, ValueError):
+        pass
+
+    shutil.rmtree(data_dir, ignore_errors=True)
+    os.makedirs(data_dir)
+    rng = random.Random(SEED)
+    datasets = make_archives(data_dir, scale, rng)
+    datasets['images'] = make_images(data_dir, scale, rng)
+    datasets['pdfs'] = make_pdfs(data_dir, datasets['images'], scale)
+
+    # Written last, so an interrupted run starts again from scratch
+    with open(manifest_path, 'w', encoding='utf-8') as manifest_file:
+        json.dump({'version': DATASET_VERSION, 'datasets': datasets}, manifest_file, indent=2)
+    return datasets
@@ -0,0 +1,269 @@
+""" ZIP2PDF benchmark runner
+    Measures throughput and peak memory of extraction, saving members to disk,
+    img2pdf conversion and PDF merging. Run from the repository root:
+        python -m benchmarks.run
+        python -m benchmarks.run --scale 0.25 --only extract --repeat 3 --json results.json
+    Each case runs in a fresh Python process so its peak RSS is its own; the
+    worker processes it starts are reported separately. Per-stage timings from
+    zip2pdf.instrumentation are recorded too, to show where the time goes.
+    Needs Linux (for the resource module) and no network access."""
+
+# required modules
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.datasets import ARCHIVE_FORMATS, ARCHIVE_SHAPES, ensure_datasets
+from zip2pdf import instrumentation
+
+# Generated data is kept here between runs
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), 'zip2pdf-benchmarks')
+
+# Folder the benchmarks package lives in, which child processes run from
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _link(path, output_dir):
+    """
+    Links the archive into output_dir, so it is extracted there rather than next to the generated data
+    """
+    linked_path = os.path.join(output_dir, os.path.basename(path))
+    os.symlink(path, linked_path)
+    return linked_path
+
+
+# Benchmarks
+# Each one does its set-up (imports, links) and returns the function that is timed.
+def extract_archives_case(dataset, output_dir, workers):
+    """
+    zip2pdf.extraction.extract_archives, as used by the Extract Archive file(s) button
+    """
+    from zip2pdf.extraction import extract_archives
+
+    file_path = _link(dataset['path'], output_dir)
+    return lambda: extract_archives([file_path], workers=workers)
+
+
+def save_extractions_case(dataset, output_dir, _workers):
+    """
+    zip2pdf.extraction.save_extractions for every member, in this process only
+    """
+    from zip2pdf.archives import Archive
+    from zip2pdf.extraction import COPY_BUFFER_SIZE, make_dirs, member_path, save_extractions
+    from zip2pdf.filenames import FilenameDecoder
+
+    def run():
+        buffer = bytearray(COPY_BUFFER_SIZE)
+        with Archive(dataset['path']) as archive:
+            members = archive.members()
+            decoder = FilenameDecoder.for_archive(archive, members)
+            file_members = []
+            for member in members:
+                if member.is_dir:
+                    make_dirs(member_path(decoder, member, output_dir))
+                else:
+                    file_members.append(member)
+            for member, stream in archive.iter_streams(file_members):
+                save_extractions(member_path(decoder, member, output_dir), stream, buffer)
+    return run
+
+
+def img2pdf_convert_case(dataset, output_dir, _workers):
+    """
+    img2pdf.convert of every image into one PDF, as done by images_to_pdf without a cache
+    """
+    import img2pdf
+
+    def run():
+        with open(os.path.join(output_dir, 'images.pdf'), 'wb') as pdf_file:
+            img2pdf.convert(dataset['paths'], outputstream=pdf_file)
+    return run
+
+
+def merge_pdfs_case(dataset, output_dir, _workers, compress=False):
+    """
+    zip2pdf.merge.merge_pdfs, as used by the Combine PDF files button
+    """
+    # merge_pdfs imports pikepdf on first use, which would otherwise be timed with the merge
+    import pikepdf  # pylint: disable=unused-import
+    from zip2pdf.merge import merge_pdfs
+
+    return lambda: merge_pdfs(dataset['paths'], os.path.join(output_dir, 'merged.pdf'), compress=compress)
+
+
+def all_cases():
+    """
+    {case name: (benchmark function, dataset name, extra keyword arguments)}, in run order
+    """
+    cases = {}
+    for shape in ARCHIVE_SHAPES:
+        for archive_format in ARCHIVE_FORMATS:
+            dataset = '{}-{}'.format(archive_format, shape)
+            cases['extract_archives[{}]'.format(dataset)] = (extract_archives_case, dataset, {})
+    for shape in ARCHIVE_SHAPES:
+        # .7z is written straight to disk by Archive.copy_sevenzip_members and never goes through save_extractions
+        for archive_format in ('zip', 'tar'):
+            dataset = '{}-{}'.format(archive_format, shape)
+            cases['save_extractions[{}]'.format(dataset)] = (save_extractions_case, dataset, {})
+    cases['img2pdf.convert[images]'] = (img2pdf_convert_case, 'images', {})
+    cases['merge_pdfs[pdfs]'] = (merge_pdfs_case, 'pdfs', {})
+    cases['merge_pdfs[pdfs, compress]'] = (merge_pdfs_case, 'pdfs', {'compress': True})
+    return cases
+
+
+def peak_rss_mb(who):
+    """
+    Peak resident memory in MB of this process (RUSAGE_SELF) or of its finished children (RUSAGE_CHILDREN)
+    """
+    if who == resource.RUSAGE_SELF:
+        # ru_maxrss keeps the peak of the process that started this one, VmHWM starts afresh on exec
+        with open('/proc/self/status', encoding='ascii') as status_file:
+            for line in status_file:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    # Linux reports ru_maxrss in kilobytes
+    return round(resource.getrusage(who).ru_maxrss / 1024, 1)
+
+
+def run_case(case_name, data_dir, scale, workers, timings):
+    """
+    Runs one case in this process and returns its measurements. Called inside the child process.
+    """
+    function, dataset_name, kwargs = all_cases()[case_name]
+    dataset = ensure_datasets(data_dir, scale)[dataset_name]
+    output_dir = tempfile.mkdtemp(prefix='zip2pdf-bench-')
+    try:
+        run = function(dataset, output_dir, workers, **kwargs)
+        if timings:
+            instrumentation.enable()
+        baseline_rss = peak_rss_mb(resource.RUSAGE_SELF)
+        started = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - started
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    return {
+        'case': case_name,
+        'seconds': round(seconds, 6),
+        'items': dataset['items'],
+        'bytes': dataset['bytes'],
+        'items_per_s': round(dataset['items'] / seconds, 3),
+        'mb_per_s': round(dataset['bytes'] / seconds / (1024 * 1024), 3),
+        'baseline_rss_mb': baseline_rss,
+        'peak_rss_mb': peak_rss_mb(resource.RUSAGE_SELF),
+        # How much the case itself added on top of the interpreter and its imports
+        'rss_growth_mb': round(peak_rss_mb(resource.RUSAGE_SELF) - baseline_rss, 1),
+        'workers_peak_rss_mb': peak_rss_mb(resource.RUSAGE_CHILDREN),
+        'stages': instrumentation.summary(),
+    }
+
+
+def run_child(case_name, args):
+    """
+    Runs one case in a fresh Python process and returns its measurements
+    """
+    command = [sys.executable, '-m', 'benchmarks.run', '--child', case_name, '--data-dir', args.data_dir,
+               '--scale', str(args.scale), '--workers', str(args.workers)]
+    if args.no_timings:
+        command.append('--no-timings')
+    output = subprocess.run(command, cwd=REPOSITORY_DIR, check=True, stdout=subprocess.PIPE,
+                            universal_newlines=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def print_result(result, show_stages):
+    """
+    One table row, followed by the stage breakdown when asked for
+    """
+    print('{:<34} {:>8.3f} {:>9.1f} {:>10.1f} {:>9.1f} {:>9.1f}'.format(
+        result['case'], result['seconds'], result['mb_per_s'], result['items_per_s'],
+        result['rss_growth_mb'], result['workers_peak_rss_mb']))
+    if show_stages:
+        for name, stage in sorted(result['stages'].items(), key=lambda item: -item[1]['seconds']):
+            rate = '' if stage['mb_per_s'] is None else '{:.1f} MB/s'.format(stage['mb_per_s'])
+            print('    {:<30} {:>8.3f}s {:>9} calls {:>14}'.format(name, stage['seconds'], stage['calls'], rate))
+
+
+def build_parser():
+    """
+    Command line arguments
+    """
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run', description='Benchmark ZIP2PDF.')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR,
+                        help='folder for the generated data, reused between runs (default: %(default)s)')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiplies the member counts, member sizes, images and PDFs (default: %(default)s)')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='worker processes for extract_archives (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='runs per case; the fastest is reported (default: %(default)s)')
+    parser.add_argument('--only', action='append', default=[], metavar='TEXT',
+                        help='only run cases whose name contains TEXT, may be given several times')
+    parser.add_argument('--stages', action='store_true', help='print the per-stage timings of each case')
+    parser.add_argument('--no-timings', action='store_true',
+                        help='do not record per-stage timings, to measure without their small overhead')
+    parser.add_argument('--json', metavar='PATH', help='also write every measurement to this file')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--prepare', action='store_true', help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    """
+    Generates the data if needed, runs the cases and prints the results table
+    """
+    args = build_parser().parse_args(argv)
+    args.data_dir = os.path.abspath(args.data_dir)
+    if args.child:
+        print(json.dumps(run_case(args.child, args.data_dir, args.scale, args.workers, not args.no_timings)))
+        return 0
+    if args.prepare:
+        ensure_datasets(args.data_dir, args.scale)
+        return 0
+
+    case_names = [name for name in all_cases() if not args.only or any(text in name for text in args.only)]
+    if not case_names:
+        print('no benchmark matches {}'.format(', '.join(args.only)), file=sys.stderr)
+        return 2
+
+    print('Preparing data in {} ...'.format(args.data_dir), flush=True)
+    # Generated in a process of its own: the workers' peak RSS would otherwise start from generating the data
+    subprocess.run([sys.executable, '-m', 'benchmarks.run', '--prepare', '--data-dir', args.data_dir,
+                    '--scale', str(args.scale)], cwd=REPOSITORY_DIR, check=True)
+
+    print('{:<34} {:>8} {:>9} {:>10} {:>9} {:>9}'.format(
+        'case', 'seconds', 'MB/s', 'items/s', '+RSS MB', 'worker MB'))
+    results = []
+    for case_name in case_names:
+        runs = [run_child(case_name, args) for _repeat in range(max(1, args.repeat))]
+        best = dict(min(runs, key=lambda run: run['seconds']))
+        best['peak_rss_mb'] = max(run['peak_rss_mb'] for run in runs)
+        best['rss_growth_mb'] = max(run['rss_growth_mb'] for run in runs)
+        best['workers_peak_rss_mb'] = max(run['workers_peak_rss_mb'] for run in runs)
+        best['runs'] = [run['seconds'] for run in runs]
+        results.append(best)
+        print_result(best, args.stages)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as json_file:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'scale': args.scale,
+                'workers': args.workers,
+                'results': results,
+            }, json_file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
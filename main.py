@@ -3,30 +3,48 @@
     and then convert image files to a single PDF."""
 
 # required modules
-import errno
+import multiprocessing
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 
 # GUI libraries
 import tkinter as tk
 from tkinter import filedialog
 from tkinter import messagebox
-from tkinter.ttk import Progressbar
+from tkinter.ttk import Progressbar, Treeview
 
 # ZIP extracting libraries
-from zipfile import ZipFile
-from unrar import rarfile
-from py7zr import SevenZipFile
-from tarfile import TarFile
-
-# Image to PDF libraries
-import img2pdf
-
-# PDF merging libraries
-from PyPDF2 import PdfFileMerger
+# zip2pdf loads these on demand; importing them here lets PyInstaller find and bundle them
+import zipfile  # pylint: disable=unused-import
+import tarfile  # pylint: disable=unused-import
+import py7zr  # pylint: disable=unused-import
+from unrar import rarfile  # pylint: disable=unused-import
 
 # This import is specifically to address an error post packaging
 from pikepdf import _cpphelpers
 
+# Image to PDF and archive straight to PDF, without extracting to disk
+from zip2pdf.convert import archive_to_pdf, folder_to_pdf, images_to_pdf
+
+# Cache of converted pages, so rebuilding a PDF only converts new or changed images
+from zip2pdf.pagecache import PageCache
+
+# PDF merging
+from zip2pdf.merge import merge_pdfs
+
+# Headless command line
+from zip2pdf import cli as zip2pdf_cli
+
+# Parallel archive extraction
+from zip2pdf.extraction import DEFAULT_WORKERS, extract_archives
+
+# Background jobs, so the window never freezes during long operations
+from zip2pdf.scheduler import FAILED, RUNNING, JobScheduler
+
+# Opt-in per-stage timings, turned on with the ZIP2PDF_TIMINGS environment variable
+from zip2pdf import instrumentation
+
 
 # Main Application class
 class MainApplication:
@@ -45,7 +63,7 @@ class MainApplication:
 
         # Canvas
         # Create window with labels above appropriate buttons
-        self.main_canvas = tk.Canvas(master, width=450, height=475, bg='lightsteelblue2', relief='raised')
+        self.main_canvas = tk.Canvas(master, width=450, height=660, bg='lightsteelblue2', relief='raised')
         self.main_canvas.pack()
 
         # Labels
@@ -94,10 +112,51 @@ class MainApplication:
                                             bg='green', fg='white', font=('helvetica', 12, 'bold'))
         self.main_canvas.create_window(125, 190, window=self.extract_zip_button)
 
+        # Button to convert the images inside the selected archive(s) directly to PDF
+        self.archive_to_pdf_button = tk.Button(text="Archive(s) to PDF", command=self.convert_archive_file,
+                                               bg='green', fg='white', font=('helvetica', 12, 'bold'))
+        self.main_canvas.create_window(125, 240, window=self.archive_to_pdf_button)
+
+        # Number of worker processes used for extraction and page preparation
+        self.workers_label = tk.Label(master, text='Workers', bg='lightsteelblue2', font=('helvetica', 12))
+        self.main_canvas.create_window(95, 290, window=self.workers_label)
+        self.workers_spinbox = tk.Spinbox(master, from_=1, to=DEFAULT_WORKERS, width=4)
+        self.workers_spinbox.delete(0, tk.END)
+        self.workers_spinbox.insert(0, DEFAULT_WORKERS)
+        self.main_canvas.create_window(160, 290, window=self.workers_spinbox)
+
+        # Progress of the selected job, or of the first running one
+        self.progress_bar = Progressbar(master, orient='horizontal', length=400, mode='determinate')
+        self.main_canvas.create_window(235, 340, window=self.progress_bar)
+        self.progress_label = tk.Label(master, text='', bg='lightsteelblue2', font=('helvetica', 10))
+        self.main_canvas.create_window(235, 365, window=self.progress_label)
+
+        # Job queue
+        self.job_tree = Treeview(master, columns=('status', 'progress', 'rate'), height=6)
+        self.job_tree.heading('#0', text='Job')
+        self.job_tree.heading('status', text='Status')
+        self.job_tree.heading('progress', text='Progress')
+        self.job_tree.heading('rate', text='Rate')
+        self.job_tree.column('#0', width=190)
+        self.job_tree.column('status', width=70)
+        self.job_tree.column('progress', width=70, anchor=tk.E)
+        self.job_tree.column('rate', width=70, anchor=tk.E)
+        self.main_canvas.create_window(235, 465, window=self.job_tree)
+
+        # Button to cancel the job(s) selected in the queue
+        self.cancel_job_button = tk.Button(text="Cancel Job", command=self.cancel_selected_jobs,
+                                           bg='darkorange', fg='white', font=('helvetica', 12, 'bold'))
+        self.main_canvas.create_window(150, 565, window=self.cancel_job_button)
+
+        # Button to remove finished jobs from the queue
+        self.clear_jobs_button = tk.Button(text="Clear Finished", command=self.clear_finished_jobs,
+                                           bg='grey40', fg='white', font=('helvetica', 12, 'bold'))
+        self.main_canvas.create_window(320, 565, window=self.clear_jobs_button)
+
         # Close application button
         self.close_application_button = tk.Button(text="Close Application", command=self.window_close,
                                                   bg='red', fg='white', font=('helvetica', 12, 'bold'))
-        self.main_canvas.create_window(235, 400, window=self.close_application_button)
+        self.main_canvas.create_window(235, 620, window=self.close_application_button)
 
         # Global Variables used in various functions
         # Used in select_image_file and convert_image_file
@@ -106,6 +165,17 @@ class MainApplication:
         # Used in select_archive_file and extract_archive_file
         self.zip_file_path_list = []
 
+        # Used in convert_image_file and select_image_folder
+        self.page_cache = PageCache()
+
+        # Every long operation runs here, off the Tk main thread.
+        # Extraction and PDF jobs have separate lanes, so one can run while the other does.
+        self.scheduler = JobScheduler()
+
+        # Failed jobs whose error was already shown
+        self.reported_job_ids = set()
+        self.master.after(200, self.poll_jobs)
+
     # Functions
     # Select Image file(s) function.
     def select_image_file(self):
@@ -123,48 +193,36 @@ class MainApplication:
         Converts the selected images and merges them into a single PDF at the desired location and name
         """
         export_file_path = filedialog.asksaveasfilename(defaultextension='.pdf')
-        with open(export_file_path, "wb") as pdf_file:
-            pdf_file.write(img2pdf.convert(self.image_list))
+        if not export_file_path:
+            return
+        self.scheduler.submit('pdf', os.path.basename(export_file_path), self.run_with_pool, images_to_pdf,
+                              list(self.image_list), export_file_path, cache=self.page_cache)
 
     # Select image folder(s) function and convert all image files inside to PDF
-    @staticmethod
-    def select_image_folder():
+    def select_image_folder(self):
         """
         Converts ALL image files within the selected image folder to a single PDF
         """
         image_folder_path = filedialog.askdirectory()
         image_folder_save_path = filedialog.asksaveasfilename(defaultextension='pdf')
-        with open(image_folder_save_path, 'wb') as save_folder:
-            image_list = []
-            for file_name in os.listdir(image_folder_path):
-                if not file_name.endswith('.jpg'):
-                    continue
-                path = os.path.join(image_folder_path, file_name)
-                if os.path.isdir(path):
-                    continue
-                image_list.append(path)
-            save_folder.write(img2pdf.convert(image_list))
+        if not image_folder_path or not image_folder_save_path:
+            return
+        self.scheduler.submit('pdf', os.path.basename(image_folder_save_path), self.run_with_pool, folder_to_pdf,
+                              image_folder_path, image_folder_save_path, cache=self.page_cache)
 
     # Combine PDF files function
-    @staticmethod
-    def combine_pdf_files():
+    def combine_pdf_files(self):
         """
         Combines PDF files to create a single file
         """
-        merger = PdfFileMerger()
-        selected_pdfs_list = []
-        selected_pdfs = filedialog.askopenfilenames()
-
-        # adds selected PDFs to list for later use
-        for pdfs in selected_pdfs:
-            selected_pdfs_list.append(pdfs)
+        selected_pdfs_list = list(filedialog.askopenfilenames())
 
         # select file name and save location of final PDF output
         final_pdf_file_path = filedialog.asksaveasfilename(defaultextension='.pdf')
-        with open(final_pdf_file_path, 'wb') as final_pdf:
-            for pdf_files in selected_pdfs_list:
-                merger.append(pdf_files)
-            merger.write(final_pdf)
+        if not selected_pdfs_list or not final_pdf_file_path:
+            return
+        self.scheduler.submit('pdf', os.path.basename(final_pdf_file_path), merge_pdfs,
+                              selected_pdfs_list, final_pdf_file_path)
 
     # Select ZIP file function
     def select_archive_file(self):
@@ -174,79 +232,89 @@ class MainApplication:
         zip_file_path = filedialog.askopenfilenames()
         self.zip_file_path_list = list(zip_file_path)
 
+    # Archive to PDF function
+    def convert_archive_file(self):
+        """
+        Converts the images inside the user selected archive(s) directly to PDF, without extracting them.
+        Saves each PDF to the same location as the original archive with the same name
+        """
+        for file_path in self.zip_file_path_list:
+            self.scheduler.submit('pdf', os.path.basename(file_path), archive_to_pdf, file_path)
+
     # ZIP Extraction function
     def extract_archive_file(self):
         """
-        Extracts the user selected file(s).
+        Extracts the user selected file(s) in the background using a pool of worker processes.
         Saves them to the same location as the original archive with the same name
         """
-        # Dictionary to store file extensions and their appropriate extraction function
-        archive_dict = {
-            '.zip': ZipFile,
-            '.rar': rarfile.RarFile,
-            '.7z': SevenZipFile,
-            '.tar': TarFile,
-        }
-
-        # get zip file name
-        zip_folder_name = self.zip_file_path_list
-
-        for file_path in zip_folder_name:
-
-            # Extension is used to use the right filetype library function for extraction.
-            file_name, file_extension = os.path.splitext(file_path)
-            with archive_dict[file_extension](file_path, 'r') as archive_ref:
-
-                # This try loop is because SevenZipFile's attribute is named differently than ZipFile and RarFile
-                try:
-                    for files_in_archive in archive_ref.infolist():
-                        bad_filename = files_in_archive.filename
-                        self.save_extractions(bad_filename, file_name, archive_ref, files_in_archive)
-
-                # An AttributeError is raised, so the exception uses SevenZipFile/TarFile's attribute.
-                # This may be a problem if more libraries are supported and also have different attribute names
-                except AttributeError:
-
-                    # Testing shows that encoding/decoding for Japanese characters is not needed with SevenZipFile
-                    # Using a similar for-loop, as above, causes program freeze if .7z is too large.
-                    archive_ref.extractall(file_name)
-
-    # Save files
-    def save_extractions(self, bad_filename, file_name, archive_ref, files_in_archive):
+        if not self.zip_file_path_list:
+            return
+        description = 'Extract ' + ', '.join(os.path.basename(file_path) for file_path in self.zip_file_path_list)
+        self.scheduler.submit('extract', description, extract_archives, list(self.zip_file_path_list),
+                              workers=self.worker_count())
+
+    def worker_count(self):
         """
-        Function is for encoding and decoding, then saving the extracted files.
-        It is currently only being used for .zip and .rar files, respectively.
+        Number of worker processes chosen in the Workers spinbox
         """
-        # Runs encode_decode function for Japanese Kanji, Hiragana, and Katakana
-        decoded_files = self.encode_decode_function(bad_filename)
-        # Saves unzipped file to the same location as original ZIP file.
-        final_file_name = os.path.join(file_name, decoded_files)
-
-        if not os.path.exists(os.path.dirname(final_file_name)):
-            try:
-                os.makedirs(os.path.dirname(final_file_name))
-            except OSError as exc:
-                if exc.errno != errno.EEXIST:
-                    raise
-
-        if not final_file_name.endswith('/'):
-            with open(final_file_name, 'wb') as dest:
-                dest.write(archive_ref.read(files_in_archive))
-
-    # Encode / Decode function
-    @staticmethod
-    def encode_decode_function(bad_filename):
+        try:
+            return max(1, int(self.workers_spinbox.get()))
+        except ValueError:
+            return DEFAULT_WORKERS
+
+    def run_with_pool(self, function, *args, **kwargs):
         """
-        Function tries to encode to 'cp437' and decode to 'sjis'.
-        If it cannot be encoded to 'cp437' it will attempt to use 'cp932'. This is primarily for Katakana
+        Runs a conversion with its pages prepared in a pool of worker processes
         """
-        # tries to encode using cp437 first
-        try:
-            decoded_files = bad_filename.encode('cp437').decode('sjis')
-        # if cp437 doesn't work, tries cp932. Mainly for Katakana
-        except UnicodeEncodeError:  # shift_jisx0213
-            decoded_files = bad_filename.encode('cp932').decode('sjis')
-        return decoded_files
+        with ProcessPoolExecutor(max_workers=self.worker_count()) as executor:
+            function(*args, executor=executor, **kwargs)
+
+    # Job queue functions
+    def poll_jobs(self):
+        """
+        Refreshes the job queue and the Progressbar from the scheduler.
+        Tk must only be touched from the main thread, so the jobs are read here rather than pushing updates.
+        """
+        for job in self.scheduler.jobs:
+            row_id = str(job.job_id)
+            values = (job.status, '{:.0%}'.format(job.fraction), '{:.1f}/s'.format(job.throughput))
+            if self.job_tree.exists(row_id):
+                self.job_tree.item(row_id, values=values)
+            else:
+                self.job_tree.insert('', tk.END, iid=row_id, text=job.description, values=values)
+
+            if job.status == FAILED and job.job_id not in self.reported_job_ids:
+                self.reported_job_ids.add(job.job_id)
+                messagebox.showerror('Job failed', '{}\n\n{}'.format(job.description, job.error))
+
+        selected = [self.scheduler.job(int(row_id)) for row_id in self.job_tree.selection()]
+        running = [job for job in self.scheduler.jobs if job.status == RUNNING]
+        shown_jobs = selected or running
+        if shown_jobs:
+            self.progress_bar['value'] = 100 * shown_jobs[0].fraction
+            self.progress_label.config(text='{} ({})'.format(shown_jobs[0].description, shown_jobs[0].status))
+        else:
+            self.progress_bar['value'] = 0
+            self.progress_label.config(text='')
+
+        self.master.after(200, self.poll_jobs)
+
+    def cancel_selected_jobs(self):
+        """
+        Cancels the job(s) selected in the queue
+        """
+        for row_id in self.job_tree.selection():
+            self.scheduler.cancel(int(row_id))
+
+    def clear_finished_jobs(self):
+        """
+        Removes finished, failed and cancelled jobs from the queue
+        """
+        self.scheduler.clear_finished()
+        kept = {str(job.job_id) for job in self.scheduler.jobs}
+        for row_id in self.job_tree.get_children():
+            if row_id not in kept:
+                self.job_tree.delete(row_id)
 
     # Window close confirmation
     def window_close(self):
@@ -254,19 +322,46 @@ class MainApplication:
         Basic windows close confirmation message.
         """
         if messagebox.askokcancel("Quit", "Do you want to close the application?"):
+            # Running jobs are asked to stop, but not waited for here so the window closes at once
+            self.scheduler.shutdown(wait=False)
             self.master.destroy()
 
+    def close(self):
+        """
+        Waits for the cancelled jobs to stop, then releases what they used. Runs once the window is gone.
+        """
+        self.scheduler.shutdown()
+        self.page_cache.close()
+        if instrumentation.is_enabled():
+            instrumentation.export(instrumentation.environment_path())
+
 
 # Application
 def main():
     """
     application loop
     """
+    if instrumentation.environment_path():
+        instrumentation.enable()
     root = tk.Tk()
     root.resizable(False, False)  # prevent window resizing
-    MainApplication(root)
+    app = MainApplication(root)
     root.mainloop()
+    app.close()
+
+
+# Command line
+def cli():
+    """
+    headless entry point, runs jobs without opening the window
+    """
+    return zip2pdf_cli.main()
 
 
 if __name__ == "__main__":
+    # Needed for the worker processes once packaged with PyInstaller
+    multiprocessing.freeze_support()
+    # Any arguments mean an unattended run, e.g. 'ZIP2PDF.exe run jobs.json'
+    if len(sys.argv) > 1:
+        sys.exit(cli())
     main()
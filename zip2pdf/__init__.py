@@ -0,0 +1,3 @@
+""" ZIP2PDF core
+    GUI-free building blocks used by main.py: reading archives and turning
+    their images into PDF files."""
@@ -0,0 +1,9 @@
+""" ZIP2PDF
+    Allows running the command line with 'python -m zip2pdf'."""
+
+import sys
+
+from zip2pdf.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,311 @@
+""" ZIP2PDF archives
+    Opens every supported archive format behind one interface so that members
+    can be listed and read as streams without extracting them to disk first."""
+
+# required modules
+import contextlib
+import ctypes
+import importlib
+import io
+import os
+import struct
+import tempfile
+from collections import namedtuple
+
+# Archive extension and the (module, class) of the library that opens it.
+# Backends are imported on first use, so only the formats actually used get loaded.
+ARCHIVE_BACKENDS = {
+    '.zip': ('zipfile', 'ZipFile'),
+    '.rar': ('unrar.rarfile', 'RarFile'),
+    '.7z': ('py7zr', 'SevenZipFile'),
+    '.tar': ('tarfile', 'TarFile'),
+}
+
+# Image file extensions img2pdf is able to embed
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tif', '.tiff', '.gif', '.bmp', '.jp2')
+
+# 7z members are read in one pass over the archive. About this many bytes of them are
+# held in memory; the members after that are spilled to temporary files.
+SEVENZIP_MEMORY_BYTES = 64 * 1024 * 1024
+
+# unrar's RarInfo.flag_bits value marking a directory entry
+RAR_DIRECTORY_FLAG = 0x20
+
+# One archive member, whatever library it came from.
+# 'info' is the backend's own member object (ZipInfo, RarInfo, FileInfo or TarInfo).
+ArchiveMember = namedtuple('ArchiveMember', ['name', 'size', 'is_dir', 'info'])
+
+
+def is_image(file_name):
+    """
+    True when the file name has an extension img2pdf can convert
+    """
+    return os.path.splitext(file_name)[1].lower() in IMAGE_EXTENSIONS
+
+
+def archive_class(extension):
+    """
+    Imports and returns the archive class used for the given extension, e.g. '.zip'
+    """
+    module_name, class_name = ARCHIVE_BACKENDS[extension]
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+class Archive:
+    """
+    Read-only view of one archive file, whichever library backs it
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.extension = os.path.splitext(file_path)[1].lower()
+        self.archive_ref = archive_class(self.extension)(file_path, 'r')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Closes the underlying archive. unrar's RarFile has nothing to close.
+        """
+        close = getattr(self.archive_ref, 'close', None)
+        if close is not None:
+            close()
+
+    def members(self):
+        """
+        Lists the archive's members in archive order
+        """
+        if self.extension == '.zip':
+            return [ArchiveMember(info.filename, info.file_size, info.is_dir(), info)
+                    for info in self.archive_ref.infolist()]
+        if self.extension == '.rar':
+            return [ArchiveMember(info.filename, info.file_size, bool(info.flag_bits & RAR_DIRECTORY_FLAG), info)
+                    for info in self.archive_ref.infolist()]
+        if self.extension == '.7z':
+            # FileInfo.uncompressed is None for empty files and directories
+            return [ArchiveMember(info.filename, info.uncompressed or 0, info.is_directory, info)
+                    for info in self.archive_ref.list()]
+        # TarFile: links and device files have no data to read, so they are left out
+        return [ArchiveMember(info.name, info.size, info.isdir(), info)
+                for info in self.archive_ref.getmembers() if info.isfile() or info.isdir()]
+
+    def image_members(self):
+        """
+        Lists the archive's image files in archive order
+        """
+        return [member for member in self.members() if not member.is_dir and is_image(member.name)]
+
+    def iter_streams(self, members):
+        """
+        Yields (member, file object) for each of the given file members, in order.
+        Each file object is only valid until the next one is requested.
+        """
+        if self.extension == '.7z':
+            yield from self._iter_sevenzip_streams(members)
+            return
+        if self.extension == '.rar':
+            yield from self._iter_rar_streams(members)
+            return
+        for member in members:
+            if self.extension == '.zip':
+                with self.archive_ref.open(member.info) as stream:
+                    yield member, stream
+            else:
+                yield member, self.archive_ref.extractfile(member.info)
+
+    def copy_rar_members(self, members, open_dest):
+        """
+        Streams .rar members chunk by chunk into the file objects returned by open_dest(member),
+        in a single pass over the archive. RarFile.open() would hold each whole member in memory.
+        """
+        for _member in self._iter_rar_members(members, open_dest):
+            pass
+
+    def _iter_rar_streams(self, members):
+        """
+        Decompresses .rar members one at a time in a single pass over the archive and yields them,
+        in archive order. RarFile.open() starts over from the first member on every call, which
+        on a solid archive means decompressing everything before the member again.
+        """
+        current = {}
+
+        def open_buffer(member):
+            # Left open once written, so it can be read back before the next member
+            current['stream'] = io.BytesIO()
+            return contextlib.nullcontext(current['stream'])
+
+        for member in self._iter_rar_members(members, open_buffer):
+            stream = current.pop('stream')
+            stream.seek(0)
+            yield member, stream
+
+    def _iter_rar_members(self, members, open_dest):
+        """
+        Walks the .rar once, decompressing each of the members into the file object returned by
+        open_dest(member) and yielding the member once it has been written
+        """
+        # pylint: disable=protected-access
+        # The binding has no streaming API, so this drives unrarlib the same way RarFile.open() does
+        from unrar import constants, unrarlib
+
+        rar_file = self.archive_ref
+        wanted = {member.name: member for member in members}
+        current = {'dest': None, 'missing_password': False}
+
+        def process_data(msg, _user_data, address, size):
+            if msg in (constants.UCM_NEEDPASSWORD, constants.UCM_NEEDPASSWORDW):
+                current['missing_password'] = True
+                return -1
+            if msg == constants.UCM_PROCESSDATA and current['dest'] is not None:
+                current['dest'].write((ctypes.c_char * size).from_address(address))
+            return 1
+
+        archive_data = unrarlib.RAROpenArchiveDataEx(rar_file.filename, mode=constants.RAR_OM_EXTRACT)
+        handle = rar_file._open(archive_data)
+        if rar_file.pwd is not None:
+            unrarlib.RARSetPassword(handle, rar_file.pwd.encode())
+        c_callback = unrarlib.UNRARCALLBACK(process_data)
+        unrarlib.RARSetCallback(handle, c_callback, 0)
+
+        try:
+            rar_info = rar_file._read_header(handle)
+            while rar_info is not None:
+                member = wanted.get(rar_info.filename)
+                if member is None:
+                    rar_file._process_current(handle, constants.RAR_SKIP)
+                else:
+                    with open_dest(member) as dest:
+                        current['dest'] = dest
+                        rar_file._process_current(handle, constants.RAR_TEST)
+                        current['dest'] = None
+                    yield member
+                rar_info = rar_file._read_header(handle)
+        except unrarlib.UnrarException as exc:
+            if current['missing_password']:
+                raise RuntimeError('File is encrypted, password required') from exc
+            raise RuntimeError('Bad RAR archive data: {}'.format(exc)) from exc
+        finally:
+            rar_file._close(handle)
+
+    def copy_sevenzip_members(self, members, open_dest):
+        """
+        Decompresses .7z members chunk by chunk into the file objects returned by open_dest(member),
+        in a single pass over the archive. Each destination is only opened once its member is reached.
+        """
+        # SevenZipFile.read() and extractall() choose the destinations themselves, so its
+        # worker is given them directly, the same way those two register their own
+        from py7zr import Bad7zFile
+
+        sevenzip_file = self.archive_ref
+        wanted = {member.name: member for member in members}
+        for archive_file in sevenzip_file.files:
+            # Refused the same way extractall() does
+            if archive_file.filename.startswith('../'):
+                raise Bad7zFile('Member name {} points outside the archive'.format(archive_file.filename))
+            member = wanted.get(archive_file.filename)
+            target = None if member is None else _SevenZipTarget(member, open_dest)
+            sevenzip_file.worker.register_filelike(archive_file.id, target)
+        try:
+            sevenzip_file.worker.extract(sevenzip_file.fp, parallel=False)
+        finally:
+            # SevenZipFile has to be rewound before it can be read again
+            sevenzip_file.reset()
+
+    def _iter_sevenzip_streams(self, members):
+        """
+        Decompresses the 7z members in a single pass over the archive and yields them in the
+        requested order. A solid archive can only be decompressed from the start of each block,
+        so reading it in several passes would decompress the same data over and over.
+        """
+        # The first members are kept in memory, the rest are spilled to temporary files
+        # so memory stays around SEVENZIP_MEMORY_BYTES however large the archive is
+        buffers = {}
+        memory_bytes = 0
+        for member in members:
+            memory_bytes += member.size
+            if memory_bytes <= SEVENZIP_MEMORY_BYTES:
+                buffers[member.name] = io.BytesIO()
+            else:
+                buffers[member.name] = tempfile.TemporaryFile()
+        try:
+            # Left open once written, so they can be read back afterwards
+            self.copy_sevenzip_members(members, lambda member: contextlib.nullcontext(buffers[member.name]))
+            for member in members:
+                stream = buffers.pop(member.name)
+                stream.seek(0)
+                with stream:
+                    yield member, stream
+        finally:
+            for stream in buffers.values():
+                stream.close()
+
+
+class _SevenZipTarget:
+    """
+    Stands in for the pathlib.Path py7zr's worker writes one member to.
+    The worker creates its parent folder, then opens it for writing.
+    """
+
+    def __init__(self, member, open_dest):
+        self.member = member
+        self.open_dest = open_dest
+
+    @property
+    def parent(self):
+        """
+        Itself, as open_dest creates whatever folder it needs
+        """
+        return self
+
+    def mkdir(self, **_options):
+        """
+        Nothing to create, see parent
+        """
+
+    def open(self, mode='wb'):
+        """
+        The member's destination file object
+        """
+        return self.open_dest(self.member)
+
+def iter_listed_streams(file_path, members):
+    """
+    Yields (member, file object) for .zip/.tar file members listed earlier by Archive.members(),
+    reading each one straight from its offset in the file. Unlike opening an Archive, this
+    never reads the zip central directory or walks the tar headers again, so a worker
+    handling part of a large archive only pays for its own members.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == '.tar':
+        # TarFile only reads the first header when opened; extractfile() seeks to the member's data
+        with archive_class(extension)(file_path, 'r') as tar_ref:
+            for member in members:
+                yield member, tar_ref.extractfile(member.info)
+        return
+    with open(file_path, 'rb') as raw_file:
+        for member in members:
+            with _open_listed_zip_member(raw_file, member.info) as stream:
+                yield member, stream
+
+
+def _open_listed_zip_member(raw_file, info):
+    """
+    Opens one member of an open .zip file from its ZipInfo, the way ZipFile.open() does
+    """
+    # pylint: disable=protected-access
+    # ZipFile.open() can only be reached after parsing the whole central directory,
+    # so the local header is read here with zipfile's own layout constants
+    import zipfile
+
+    if info.flag_bits & 0x1:
+        raise RuntimeError('File {} is encrypted, password required'.format(info.filename))
+    raw_file.seek(info.header_offset)
+    header = struct.unpack(zipfile.structFileHeader, raw_file.read(zipfile.sizeFileHeader))
+    if header[zipfile._FH_SIGNATURE] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile('Bad magic number for file header')
+    raw_file.seek(header[zipfile._FH_FILENAME_LENGTH] + header[zipfile._FH_EXTRA_FIELD_LENGTH], os.SEEK_CUR)
+    return zipfile.ZipExtFile(raw_file, 'r', info, None, False)
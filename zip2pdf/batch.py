@@ -0,0 +1,201 @@
+""" ZIP2PDF batch jobs
+    Runs many jobs, described as dictionaries or in a JSON manifest, inside one
+    process. A Session keeps its extraction worker pool and the already imported
+    conversion libraries warm from one job to the next.
+
+    Manifest example:
+        {
+            "workers": 8,
+            "jobs": [
+                {"type": "extract", "archives": ["scans/a.zip", "scans/b.rar"]},
+                {"type": "archive_to_pdf", "archives": ["scans/c.7z"], "output_dir": "pdf"},
+                {"type": "folder_to_pdf", "folder": "scans/a", "output": "pdf/a.pdf", "target_dpi": 200},
+                {"type": "images_to_pdf", "images": ["cover.jpg", "back.jpg"], "output": "pdf/cover.pdf"},
+                {"type": "merge", "inputs": ["pdf/cover.pdf", "pdf/a.pdf"], "output": "pdf/final.pdf", "compress": true}
+            ]
+        }
+    Relative paths are resolved against the folder holding the manifest.
+    Conversion jobs may set "target_dpi" and "jpeg_quality" to override the session's options,
+    and extract jobs may set "name_encoding" (e.g. "cp932") to skip codepage detection."""
+
+# required modules
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from zip2pdf import convert, extraction, merge
+
+# Job type and the keys each job of that type must have
+REQUIRED_KEYS = {
+    'extract': ('archives',),
+    'archive_to_pdf': ('archives',),
+    'folder_to_pdf': ('folder', 'output'),
+    'images_to_pdf': ('images', 'output'),
+    'merge': ('inputs', 'output'),
+}
+
+# Job keys passed on to prepare.prepare_page
+OPTION_KEYS = ('target_dpi', 'jpeg_quality')
+
+# Job keys holding a single path or a list of paths
+PATH_KEYS = ('folder', 'output', 'output_dir')
+PATH_LIST_KEYS = ('archives', 'images', 'inputs')
+
+# Outcome of one job. 'error' is None when the job succeeded.
+JobResult = namedtuple('JobResult', ['job', 'error', 'seconds'])
+
+
+class ManifestError(ValueError):
+    """
+    Raised when a manifest or one of its jobs is malformed
+    """
+
+
+def validate_job(job):
+    """
+    Checks the job has a known type and every key that type needs
+    """
+    if not isinstance(job, dict):
+        raise ManifestError('Job must be an object, got {!r}'.format(job))
+    job_type = job.get('type')
+    if job_type not in REQUIRED_KEYS:
+        raise ManifestError('Unknown job type {!r}, expected one of {}'.format(job_type, ', '.join(REQUIRED_KEYS)))
+    missing = [key for key in REQUIRED_KEYS[job_type] if key not in job]
+    if missing:
+        raise ManifestError('{} job is missing {}'.format(job_type, ', '.join(missing)))
+    for key in PATH_LIST_KEYS:
+        if key in job and not isinstance(job[key], list):
+            raise ManifestError('{} job key {!r} must be a list of paths'.format(job_type, key))
+
+
+def resolve_paths(job, base_folder):
+    """
+    Returns a copy of the job with its relative paths made relative to base_folder
+    """
+    resolved = dict(job)
+    for key in PATH_KEYS:
+        if key in resolved:
+            resolved[key] = os.path.join(base_folder, resolved[key])
+    for key in PATH_LIST_KEYS:
+        if key in resolved:
+            resolved[key] = [os.path.join(base_folder, path) for path in resolved[key]]
+    return resolved
+
+
+def load_manifest(manifest_path):
+    """
+    Reads and validates a JSON manifest. A bare list of jobs is accepted as well.
+    """
+    with open(manifest_path, encoding='utf-8') as manifest_file:
+        try:
+            manifest = json.load(manifest_file)
+        except ValueError as exc:
+            raise ManifestError('{} is not valid JSON: {}'.format(manifest_path, exc)) from exc
+
+    if isinstance(manifest, list):
+        manifest = {'jobs': manifest}
+    if not isinstance(manifest, dict) or not isinstance(manifest.get('jobs'), list):
+        raise ManifestError('{} must contain a list of jobs'.format(manifest_path))
+
+    base_folder = os.path.dirname(os.path.abspath(manifest_path))
+    for job in manifest['jobs']:
+        validate_job(job)
+    manifest['jobs'] = [resolve_paths(job, base_folder) for job in manifest['jobs']]
+    return manifest
+
+
+class Session:
+    """
+    Runs jobs one after another, sharing warm state between them.
+    Image conversions go through a PageCache when one is given, or when cache_factory
+    is given, through the one it returns the first time a conversion needs it.
+    They use 'options' (prepare.prepare_page keyword arguments) unless a job overrides them.
+    """
+
+    def __init__(self, workers=None, cache=None, options=None, cache_factory=None):
+        self.workers = workers or extraction.DEFAULT_WORKERS
+        self._cache = cache
+        self._cache_factory = cache_factory
+        self.options = options or {}
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def executor(self):
+        """
+        Worker pool for extraction and page preparation, started the first time a job needs it
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    @property
+    def cache(self):
+        """
+        Page cache for image conversions, created the first time a job needs it.
+        Extraction and merging never touch it, so they run even where it cannot be created.
+        """
+        if self._cache is None and self._cache_factory is not None:
+            self._cache = self._cache_factory()
+        return self._cache
+
+    def close(self):
+        """
+        Shuts down the worker pool and closes the page cache
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._cache is not None:
+            self._cache.close()
+
+    def run_job(self, job):
+        """
+        Runs a single job
+        """
+        validate_job(job)
+        job_type = job['type']
+        options = dict(self.options)
+        options.update((key, job[key]) for key in OPTION_KEYS if key in job)
+        if job_type == 'extract':
+            extraction.extract_archives(job['archives'], self.workers, executor=self.executor,
+                                        name_encoding=job.get('name_encoding'))
+        elif job_type == 'archive_to_pdf':
+            for file_path in job['archives']:
+                pdf_path = None
+                if 'output_dir' in job:
+                    os.makedirs(job['output_dir'], exist_ok=True)
+                    pdf_path = os.path.join(job['output_dir'],
+                                            os.path.basename(convert.archive_pdf_path(file_path)))
+                convert.archive_to_pdf(file_path, pdf_path, options)
+        elif job_type == 'folder_to_pdf':
+            convert.folder_to_pdf(job['folder'], job['output'], cache=self.cache, options=options,
+                                  executor=self.executor)
+        elif job_type == 'images_to_pdf':
+            convert.images_to_pdf(job['images'], job['output'], cache=self.cache, options=options,
+                                  executor=self.executor)
+        else:
+            merge.merge_pdfs(job['inputs'], job['output'], compress=job.get('compress', False))
+
+    def run_jobs(self, jobs, stop_on_error=False):
+        """
+        Runs the jobs in order, yielding a JobResult as each one finishes.
+        A failed job does not stop the others unless stop_on_error is set.
+        """
+        for job in jobs:
+            start = time.perf_counter()
+            try:
+                self.run_job(job)
+            except Exception as exc:  # pylint: disable=broad-except
+                yield JobResult(job, exc, time.perf_counter() - start)
+                if stop_on_error:
+                    return
+            else:
+                yield JobResult(job, None, time.perf_counter() - start)
@@ -0,0 +1,150 @@
+""" ZIP2PDF command line
+    Headless entry point for unattended runs, e.g. from cron:
+        python -m zip2pdf extract scans/*.zip --workers 8
+        python -m zip2pdf archive2pdf scans/*.zip --output-dir pdf
+        python -m zip2pdf folder2pdf scans/a -o a.pdf
+        python -m zip2pdf images2pdf cover.jpg back.jpg -o cover.pdf
+        python -m zip2pdf merge cover.pdf a.pdf -o final.pdf --compress
+        python -m zip2pdf run jobs.json
+        python -m zip2pdf --timings timings.json extract scans/*.zip"""
+
+# required modules
+import argparse
+import sys
+import time
+from functools import partial
+
+from zip2pdf import instrumentation
+from zip2pdf.batch import OPTION_KEYS, ManifestError, Session, load_manifest
+from zip2pdf.pagecache import DEFAULT_CACHE_BYTES, DEFAULT_CACHE_DIR, PageCache
+
+
+def add_common_options(parser, defaults=True):
+    """
+    Options shared by every sub-command. They are accepted both before and after the
+    sub-command; the copies on the sub-commands have no defaults so they never override
+    a value given before it.
+    """
+    def default(value):
+        return value if defaults else argparse.SUPPRESS
+
+    parser.add_argument('-w', '--workers', type=int, default=default(None),
+                        help='number of worker processes for extraction and page preparation (default: one per CPU)')
+    parser.add_argument('--stop-on-error', action='store_true', default=default(False),
+                        help='stop at the first failed job instead of carrying on')
+    parser.add_argument('--cache-dir', default=default(DEFAULT_CACHE_DIR),
+                        help='folder of the converted page cache (default: {})'.format(DEFAULT_CACHE_DIR))
+    parser.add_argument('--cache-size-mb', type=int, default=default(DEFAULT_CACHE_BYTES // (1024 * 1024)),
+                        help='size limit of the page cache in MB (default: {})'.format(
+                            DEFAULT_CACHE_BYTES // (1024 * 1024)))
+    parser.add_argument('--no-cache', action='store_true', default=default(False),
+                        help='convert every image from scratch without the page cache')
+    parser.add_argument('--target-dpi', type=int, default=default(None),
+                        help='downscale pages above this resolution')
+    parser.add_argument('--jpeg-quality', type=int, default=default(None),
+                        help='recompress re-encoded pages as JPEG at this quality (1-95)')
+    parser.add_argument('--timings', default=default(instrumentation.environment_path()), metavar='JSON',
+                        help='record per-stage timings and byte counts and write them to this file '
+                             '(default: $' + instrumentation.TIMINGS_ENV + ')')
+
+
+def build_parser():
+    """
+    Command line arguments, one sub-command per job type plus 'run' for manifests
+    """
+    parser = argparse.ArgumentParser(prog='zip2pdf', description='Extract archives and convert images to PDF.')
+    add_common_options(parser)
+    common = argparse.ArgumentParser(add_help=False)
+    add_common_options(common, defaults=False)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    extract_parser = commands.add_parser('extract', parents=[common], help='extract archives next to themselves')
+    extract_parser.add_argument('archives', nargs='+')
+    extract_parser.add_argument('--name-encoding',
+                                help='codepage of the member names, e.g. cp932 (default: detected per archive)')
+
+    archive_parser = commands.add_parser('archive2pdf', parents=[common],
+                                         help='convert the images inside archives straight to PDF')
+    archive_parser.add_argument('archives', nargs='+')
+    archive_parser.add_argument('--output-dir', help='folder for the PDFs (default: next to each archive)')
+
+    folder_parser = commands.add_parser('folder2pdf', parents=[common],
+                                        help='convert every image in a folder to one PDF')
+    folder_parser.add_argument('folder')
+    folder_parser.add_argument('-o', '--output', required=True)
+
+    images_parser = commands.add_parser('images2pdf', parents=[common], help='convert images to one PDF')
+    images_parser.add_argument('images', nargs='+')
+    images_parser.add_argument('-o', '--output', required=True)
+
+    merge_parser = commands.add_parser('merge', parents=[common], help='combine PDF files into one')
+    merge_parser.add_argument('inputs', nargs='+')
+    merge_parser.add_argument('-o', '--output', required=True)
+    merge_parser.add_argument('--compress', action='store_true',
+                              help='drop unused resources and pack objects into compressed object streams')
+
+    run_parser = commands.add_parser('run', parents=[common], help='run every job in a JSON manifest')
+    run_parser.add_argument('manifest')
+    return parser
+
+
+def jobs_from_args(args):
+    """
+    Turns the parsed arguments into a list of jobs and the worker count to use
+    """
+    if args.command == 'run':
+        manifest = load_manifest(args.manifest)
+        return manifest['jobs'], args.workers or manifest.get('workers')
+    if args.command == 'extract':
+        job = {'type': 'extract', 'archives': args.archives}
+        if args.name_encoding:
+            job['name_encoding'] = args.name_encoding
+    elif args.command == 'archive2pdf':
+        job = {'type': 'archive_to_pdf', 'archives': args.archives}
+        if args.output_dir:
+            job['output_dir'] = args.output_dir
+    elif args.command == 'folder2pdf':
+        job = {'type': 'folder_to_pdf', 'folder': args.folder, 'output': args.output}
+    elif args.command == 'images2pdf':
+        job = {'type': 'images_to_pdf', 'images': args.images, 'output': args.output}
+    else:
+        job = {'type': 'merge', 'inputs': args.inputs, 'output': args.output, 'compress': args.compress}
+    return [job], args.workers
+
+
+def main(argv=None):
+    """
+    Runs the command line and returns the exit status: 0 if every job succeeded
+    """
+    args = build_parser().parse_args(argv)
+    try:
+        jobs, workers = jobs_from_args(args)
+    except (OSError, ManifestError) as exc:
+        print('zip2pdf: {}'.format(exc), file=sys.stderr)
+        return 2
+
+    # Only opened by the first image conversion, so extraction and merging never need a writable cache folder
+    cache_factory = None
+    if not args.no_cache:
+        cache_factory = partial(PageCache, args.cache_dir, args.cache_size_mb * 1024 * 1024)
+
+    options = {key: getattr(args, key) for key in OPTION_KEYS if getattr(args, key) is not None}
+
+    if args.timings:
+        instrumentation.enable()
+    started = time.time()
+
+    failures = 0
+    with Session(workers, options=options, cache_factory=cache_factory) as session:
+        for result in session.run_jobs(jobs, stop_on_error=args.stop_on_error):
+            if result.error is None:
+                print('ok     {:8.2f}s  {}'.format(result.seconds, result.job['type']))
+            else:
+                failures += 1
+                print('failed {:8.2f}s  {}: {}'.format(result.seconds, result.job['type'], result.error),
+                      file=sys.stderr)
+
+    if args.timings:
+        instrumentation.export(args.timings, command=args.command, seconds=round(time.time() - started, 6),
+                               failures=failures)
+    return 1 if failures else 0
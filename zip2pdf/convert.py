@@ -0,0 +1,128 @@
+""" ZIP2PDF conversion
+    Turns images into a single PDF, including straight from an archive
+    without extracting it to disk first.
+    img2pdf pulls in Pillow and pikepdf, so it is only imported once a conversion runs."""
+
+# required modules
+import os
+
+from zip2pdf import instrumentation, prepare
+from zip2pdf.archives import Archive
+
+# Extensions picked up when converting a whole folder
+FOLDER_IMAGE_EXTENSIONS = ('.jpg',)
+
+
+class _ArchivePage:
+    """
+    Stands in for one image member in the list handed to img2pdf.
+    img2pdf calls read() on each page in list order, so every page pulls the
+    next member from a single shared pass over the archive.
+    """
+
+    def __init__(self, streams, options):
+        self.streams = streams
+        self.options = options
+
+    def read(self):
+        """
+        Returns the next image member in the archive, prepared for img2pdf
+        """
+        _member, stream = next(self.streams)
+        with instrumentation.stage('decompress') as timing:
+            image = stream.read()
+            timing.nbytes = len(image)
+        return prepare.prepare_page(image, **self.options)
+
+
+def folder_images(image_folder_path, extensions=FOLDER_IMAGE_EXTENSIONS):
+    """
+    Lists the image files directly inside the folder
+    """
+    image_list = []
+    for file_name in os.listdir(image_folder_path):
+        if not file_name.lower().endswith(extensions):
+            continue
+        path = os.path.join(image_folder_path, file_name)
+        if os.path.isdir(path):
+            continue
+        image_list.append(path)
+    return image_list
+
+
+def images_to_pdf(image_list, pdf_path, cache=None, options=None, executor=None, progress=None):
+    """
+    Converts the images and merges them into a single PDF at pdf_path.
+    options are prepare.prepare_page keyword arguments, e.g. {'target_dpi': 200, 'jpeg_quality': 80}.
+    Pages are prepared in executor's worker processes when one is given, then assembled in order.
+    With a PageCache only new or changed images are converted.
+    progress(pdf_path, done, total) is called as pages are prepared.
+    """
+    def page_progress(done, total):
+        if progress is not None:
+            progress(pdf_path, done, total)
+
+    if cache is not None:
+        cache.images_to_pdf(image_list, pdf_path, options, executor, page_progress)
+        return
+
+    # Image to PDF libraries
+    import img2pdf
+
+    pages = prepare.map_pages(prepare.prepare_page, image_list, options, executor, page_progress)
+    with instrumentation.stage('img2pdf', sum(len(page) for page in pages)):
+        with open(pdf_path, 'wb') as pdf_file:
+            img2pdf.convert(pages, outputstream=pdf_file)
+
+
+def folder_to_pdf(image_folder_path, pdf_path, extensions=FOLDER_IMAGE_EXTENSIONS, cache=None, options=None,
+                  executor=None, progress=None):
+    """
+    Converts all image files within the folder to a single PDF. Returns the number of pages written.
+    """
+    image_list = folder_images(image_folder_path, extensions)
+    images_to_pdf(image_list, pdf_path, cache, options, executor, progress)
+    return len(image_list)
+
+
+def archive_pdf_path(file_path):
+    """
+    Default PDF path for an archive: same location and name, with a .pdf extension
+    """
+    return os.path.splitext(file_path)[0] + '.pdf'
+
+
+def _report_streams(streams, progress, file_path, total):
+    """
+    Passes the member streams through, calling progress(file_path, done, total) as each one is requested
+    """
+    for done, member_stream in enumerate(streams):
+        if progress is not None:
+            progress(file_path, done, total)
+        yield member_stream
+
+
+def archive_to_pdf(file_path, pdf_path=None, options=None, progress=None):
+    """
+    Converts every image inside the archive to a single PDF without extracting anything to disk.
+    Pages follow the archive order and are prepared one at a time as img2pdf reads them.
+    progress(file_path, done, total) is called as pages are read.
+    Returns the number of pages written.
+    """
+    # Image to PDF libraries
+    import img2pdf
+
+    if pdf_path is None:
+        pdf_path = archive_pdf_path(file_path)
+
+    with Archive(file_path) as archive:
+        image_members = archive.image_members()
+        if not image_members:
+            return 0
+        streams = _report_streams(archive.iter_streams(image_members), progress, file_path, len(image_members))
+        pages = [_ArchivePage(streams, options or {}) for _member in image_members]
+        # Pages are read and prepared while img2pdf runs, so this stage includes those stages
+        with instrumentation.stage('img2pdf', sum(member.size for member in image_members)):
+            with open(pdf_path, 'wb') as pdf_file:
+                img2pdf.convert(pages, outputstream=pdf_file)
+    return len(image_members)
@@ -0,0 +1,310 @@
+""" ZIP2PDF extraction
+    Extracts archives to folders next to them, spreading the work over a pool
+    of worker processes: archives run side by side and the members of a large
+    .zip or .tar are split between several workers."""
+
+# required modules
+import errno
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from zip2pdf import instrumentation
+from zip2pdf.archives import Archive, iter_listed_streams
+from zip2pdf.filenames import FilenameDecoder
+
+# Default number of worker processes
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+# Most .zip/.tar members handed to a worker at a time
+MEMBERS_PER_TASK = 256
+
+# .zip/.tar archives are cut into about this many tasks per worker, balanced by bytes,
+# so workers that finish early pick up more and progress moves steadily
+TASKS_PER_WORKER = 4
+
+# Smallest amount of data worth a task of its own
+MIN_TASK_BYTES = 4 * 1024 * 1024
+
+# Longest wait between two progress calls, so a caller can stop even a single long task
+PROGRESS_INTERVAL_SECONDS = 0.5
+
+# Longest time between two checks of a worker for a cancelled extraction.
+# Each check is a round trip to the manager process holding the cancel event.
+CANCEL_CHECK_SECONDS = 0.1
+
+# Size of the buffer each worker reuses to copy members to disk.
+# Peak memory per worker stays around this size however large a member is.
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Formats whose members can be read independently of each other.
+# .rar and .7z may be solid, where reading one member means decompressing everything before it,
+# so those are always extracted by a single worker.
+SPLITTABLE_EXTENSIONS = ('.zip', '.tar')
+
+
+class ExtractionCancelled(Exception):
+    """
+    Raised inside a worker once the extraction it is part of has been cancelled
+    """
+
+
+def cancel_checker(cancel_event):
+    """
+    Returns a function that raises ExtractionCancelled once cancel_event is set.
+    It asks the event at most every CANCEL_CHECK_SECONDS, so it can be called for every chunk.
+    """
+    if cancel_event is None:
+        return lambda: None
+    next_check = [0]
+
+    def check_cancelled():
+        now = time.monotonic()
+        if now >= next_check[0]:
+            next_check[0] = now + CANCEL_CHECK_SECONDS
+            if cancel_event.is_set():
+                raise ExtractionCancelled()
+    return check_cancelled
+
+
+def make_dirs(path):
+    """
+    Creates the folder, ignoring the case where another worker just created it
+    """
+    if not os.path.exists(path):
+        try:
+            os.makedirs(path)
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                raise
+
+
+def member_path(decoder, member, file_name):
+    """
+    Path the member is extracted to, inside the folder named after the archive.
+    The decoder recovers Japanese, Chinese and Korean names stored in the archive's codepage.
+    """
+    with instrumentation.stage('decode_names'):
+        return os.path.join(file_name, decoder.decode(member))
+
+
+def copy_stream(stream, dest, buffer, check_cancelled=None):
+    """
+    Copies stream to dest in chunks the size of buffer, reusing buffer for every chunk.
+    check_cancelled(), as returned by cancel_checker, is called before each chunk.
+    """
+    view = memoryview(buffer)
+    readinto = getattr(stream, 'readinto', None)
+    while True:
+        if check_cancelled is not None:
+            check_cancelled()
+        with instrumentation.stage('decompress') as timing:
+            if readinto is not None:
+                count = readinto(view)
+            else:
+                chunk = stream.read(len(view))
+                count = len(chunk)
+                view[:count] = chunk
+            timing.nbytes = count
+        if not count:
+            break
+        with instrumentation.stage('write', count):
+            dest.write(view[:count])
+
+
+def open_extraction(final_file_name):
+    """
+    Opens the destination file of one extracted member, creating its folder if needed
+    """
+    make_dirs(os.path.dirname(final_file_name))
+    return open(final_file_name, 'wb')
+
+
+# Save files
+def save_extractions(final_file_name, stream, buffer=None, check_cancelled=None):
+    """
+    Saves one extracted member, copying it through buffer in fixed size chunks
+    """
+    if buffer is None:
+        buffer = bytearray(COPY_BUFFER_SIZE)
+    with open_extraction(final_file_name) as dest:
+        copy_stream(stream, dest, buffer, check_cancelled)
+
+
+def _extract_listed_members(file_path, members, name_encoding, check_cancelled):
+    """
+    Extracts .zip/.tar members listed by the parent, reading them straight from their offsets
+    """
+    file_name = os.path.splitext(file_path)[0]
+    decoder = FilenameDecoder(os.path.splitext(file_path)[1].lower(), name_encoding)
+    file_members = []
+    for member in members:
+        if member.is_dir:
+            make_dirs(member_path(decoder, member, file_name))
+        else:
+            file_members.append(member)
+
+    buffer = bytearray(COPY_BUFFER_SIZE)
+    for member, stream in iter_listed_streams(file_path, file_members):
+        save_extractions(member_path(decoder, member, file_name), stream, buffer, check_cancelled)
+
+
+def extract_members(file_path, members=None, name_encoding=None, cancel_event=None):
+    """
+    Extracts the archive into a folder with the same name as the archive.
+    members, as planned by plan_tasks, limits a .zip/.tar to those members; they are read
+    from their recorded offsets so the archive is never listed again.
+    name_encoding forces the codepage of the member names instead of detecting it.
+    Once cancel_event is set, raises ExtractionCancelled at the next member or chunk.
+    Runs inside a worker process.
+    """
+    check_cancelled = cancel_checker(cancel_event)
+    if members is not None:
+        _extract_listed_members(file_path, members, name_encoding, check_cancelled)
+        return
+
+    file_name = os.path.splitext(file_path)[0]
+    with Archive(file_path) as archive:
+        members = archive.members()
+        with instrumentation.stage('detect_encoding'):
+            decoder = FilenameDecoder.for_archive(archive, members, name_encoding)
+        file_members = []
+        for member in members:
+            if member.is_dir:
+                make_dirs(member_path(decoder, member, file_name))
+            else:
+                file_members.append(member)
+
+        def open_member(member):
+            check_cancelled()
+            return open_extraction(member_path(decoder, member, file_name))
+
+        # .rar and .7z are decompressed in a single pass straight into the destination files,
+        # as each of their members may depend on the ones before it
+        if archive.extension == '.rar':
+            # unrar decompresses and writes through one callback, so both are timed as 'decompress'
+            with instrumentation.stage('decompress', sum(member.size for member in file_members)):
+                archive.copy_rar_members(file_members, open_member)
+            return
+        if archive.extension == '.7z':
+            # py7zr decompresses and writes in one go, so both are timed as 'decompress'
+            with instrumentation.stage('decompress', sum(member.size for member in file_members)):
+                archive.copy_sevenzip_members(file_members, open_member)
+            return
+
+        buffer = bytearray(COPY_BUFFER_SIZE)
+        for member, stream in archive.iter_streams(file_members):
+            save_extractions(member_path(decoder, member, file_name), stream, buffer, check_cancelled)
+
+
+def plan_tasks(file_path, workers=DEFAULT_WORKERS, name_encoding=None):
+    """
+    Splits one archive into (file_path, members, name_encoding) worker tasks.
+    The archive is listed once, here; each .zip/.tar task carries its own members, cut into runs
+    of about the same number of bytes so a few huge members still spread over the workers.
+    .rar and .7z are one task with members None.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension not in SPLITTABLE_EXTENSIONS:
+        return [(file_path, None, name_encoding)]
+
+    with Archive(file_path) as archive:
+        members = archive.members()
+        # Detected once here so the workers sharing this archive do not each have to
+        if name_encoding is None:
+            with instrumentation.stage('detect_encoding'):
+                name_encoding = FilenameDecoder.for_archive(archive, members).encoding
+
+    total_bytes = sum(member.size for member in members)
+    task_bytes = max(total_bytes // (workers * TASKS_PER_WORKER), MIN_TASK_BYTES)
+    tasks = []
+    task_members = []
+    current_bytes = 0
+    for member in members:
+        task_members.append(member)
+        current_bytes += member.size
+        if current_bytes >= task_bytes or len(task_members) >= MEMBERS_PER_TASK:
+            tasks.append((file_path, task_members, name_encoding))
+            task_members = []
+            current_bytes = 0
+    if task_members or not tasks:
+        tasks.append((file_path, task_members, name_encoding))
+    return tasks
+
+
+def task_bytes(task):
+    """
+    Amount of data a task extracts, used to start the largest tasks first
+    """
+    file_path, members, _name_encoding = task
+    if members is None:
+        return os.path.getsize(file_path)
+    return sum(member.size for member in members)
+
+
+def extract_archives(file_paths, workers=None, progress=None, executor=None, name_encoding=None):
+    """
+    Extracts every archive in file_paths using a pool of worker processes.
+    name_encoding forces the codepage of .zip/.tar member names instead of detecting it per archive.
+    progress(file_path, done, total) is called from the calling thread each time
+    one of the archive's tasks finishes, and at least every PROGRESS_INTERVAL_SECONDS
+    while tasks run; an exception raised by it stops the extraction.
+    An existing executor can be passed in to reuse its warm workers; otherwise a
+    pool of 'workers' processes is started for this call only.
+    When the extraction stops early, tasks that have not started are dropped and running ones
+    stop at their next member or chunk, leaving it partly written. This returns once they have.
+    """
+    workers = workers or DEFAULT_WORKERS
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            extract_archives(file_paths, workers, progress, executor, name_encoding)
+        return
+
+    # With timings on, the workers send back what they recorded along with each task
+    timed = instrumentation.is_enabled()
+    task_function = instrumentation.collecting(extract_members) if timed else extract_members
+    tasks = []
+    task_counts = {}
+    for file_path in file_paths:
+        archive_tasks = plan_tasks(file_path, workers, name_encoding)
+        task_counts[file_path] = [0, len(archive_tasks)]
+        tasks.extend(archive_tasks)
+
+    # Workers of any pool, including one passed in, can share an event held by a manager process
+    with multiprocessing.Manager() as manager:
+        cancel_event = manager.Event()
+        # Largest first, so no big task is left running alone at the end
+        futures = {}
+        for task in sorted(tasks, key=task_bytes, reverse=True):
+            futures[executor.submit(task_function, *task, cancel_event)] = task[0]
+
+        pending = set(futures)
+        try:
+            while pending:
+                finished, pending = wait(pending, timeout=PROGRESS_INTERVAL_SECONDS, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    # Re-raises whatever went wrong inside the worker
+                    result = future.result()
+                    if timed:
+                        instrumentation.merge(result[1])
+                    file_path = futures[future]
+                    task_counts[file_path][0] += 1
+                    if progress is not None:
+                        progress(file_path, *task_counts[file_path])
+                if not finished and progress is not None:
+                    # Nothing new, but the caller still gets its chance to stop
+                    file_path = futures[next(iter(pending))]
+                    progress(file_path, *task_counts[file_path])
+        except BaseException:
+            # Failed or cancelled through progress: drop the tasks that have not started yet
+            # and ask the running ones to stop. They use the manager until then, so it is kept.
+            for future in futures:
+                future.cancel()
+            try:
+                cancel_event.set()
+            except (OSError, EOFError):
+                # Ctrl+C stops the manager process along with this one
+                pass
+            wait(futures)
+            raise
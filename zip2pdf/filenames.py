@@ -0,0 +1,198 @@
+""" ZIP2PDF member names
+    Recovers the real names of archive members. ZIP files made on Japanese,
+    Chinese or Korean systems store names in the local codepage, which zipfile
+    reads as cp437. The codepage is detected once per archive from a sample of
+    its names, so decoding a member costs a single bytes.decode. Names flagged as
+    UTF-8 are used as they are, and a name that still cannot be decoded gets
+    replacement characters instead of stopping the extraction."""
+
+# required modules
+import os
+import unicodedata
+from itertools import islice
+
+# Codepages tried for names that are not flagged as UTF-8. Bytes in these codepages
+# often decode without error in several of them, so the candidates are ranked by
+# how natural the decoded names look; on a tie the earlier one wins, except between
+# euc_kr and gbk (see COMMON_HANGUL).
+# cp932 is Shift-JIS with the Windows extensions and comes first because most of our archives are Japanese.
+CANDIDATE_ENCODINGS = ('utf-8', 'cp932', 'euc_kr', 'gbk', 'big5')
+
+# Hangul syllables Korean names are almost entirely written with.
+# The lead bytes of the most common Chinese characters in GB2312 (0xB0-0xC8) are the
+# Hangul rows of EUC-KR, and the other way round, so many Chinese and Korean names read
+# naturally in both codepages. Chinese bytes read as EUC-KR turn mostly into rare syllables,
+# so when euc_kr and gbk tie, euc_kr is only kept if most of its syllables are in this set.
+COMMON_HANGUL = frozenset(
+    '가각간갈감갑강개객거건걸검겁것게겨격견결겸경계고곡곤골곳공과곽관광괴교구국군굴궁권귀규균그극근글금급기긴길김'
+    '까깨꺼께꼬꽃꾸꿈끄끝끼'
+    '나낙난날남납낭내냉너널넣네넷녀녁년념녕노녹논놀농높뇌누눈뉴느는늘능니닉님'
+    '다닥단달담답당대댁더덕던덤데델도독돈돌동되된될됩두둔둘드득든들등디딩따딸때떡또뚜뜻띠'
+    '라락란람랑래램랜랩러럭런럼레렉렌렛려력련렬렴령례로록론롤롬롯료룡루룸류륙륜률르른를름릉리린릴림립링'
+    '마막만말맘망매맥맨맵머먹먼메멘멜며면명모목몰몸몽묘무묵문물뭐므미민밀밍'
+    '바박반발밤방배백밴뱅버번벌범법베벤벨벽변별병보복본볼봄봉부북분불붉뷰브블비빅빈빌빛빠빨뽀뿌삐'
+    '사삭산살삼상새색샘생샤샵서석선설섬섭성세섹센셀셋셔셜소속손솔송쇄쇼숍수숙순술숨숭쉬슈스슨슬습승시식신실심십싱'
+    '싸쌍써쏘쑤쓰씨'
+    '아악안알암압앙앞애액앤앨앱야약양어억언얼엄업없에엔엘여역연열염엽영옆예오옥온올옴옵옷와완왕외요욕용우욱운울움웅'
+    '워원월웨웹위윈윌유육윤율융으은을음읍응의이익인일임입잉있'
+    '자작잔잘잠잡장재쟁저적전절점접정제젝젠젤져조족존졸종좋좌죄주죽준줄중쥬즈즉즐증지직진질짐집징짜째쪽찌'
+    '차착찬찰참창채책처척천철첨첩청체초촉촌총최추축춘출춤충취츠측층치칙친칠침칩칭'
+    '카칸칼캐캔캠커컨컬컴컵케켓켜코콘콜콤쿠퀴크큰클키킨킹'
+    '타탁탄탈탐탑태택탱터턴털테텍텐텔템토톤톱통퇴투툴튜트특튼틀티틱틴팀팅'
+    '파판팔패팩팬퍼펀페펜편평폐포폭폰폴표푸품풍퓨프픈플피픽핀필핑'
+    '하학한할함합항해핵핸햄행향허헌험헤헬혁현혈협형혜호혹혼홀홈홍화확환활황회획효후훈휘휴흐흑흔흘흥희흰히힘'
+)
+MIN_COMMON_HANGUL_SHARE = 0.7
+
+# zipfile's own reading, kept when no candidate decodes most of the sampled names.
+# It maps all 256 byte values, so it never fails.
+FALLBACK_ENCODING = 'cp437'
+
+# Share of the sampled names a candidate has to decode to be used. The few names it
+# cannot decode, e.g. one corrupt entry, get replacement characters instead.
+MIN_DECODED_SHARE = 0.8
+
+# ZIP general purpose flag bit 11: the name is stored as UTF-8
+ZIP_UTF8_FLAG = 0x800
+
+# Number of non-ASCII names used to detect an archive's codepage
+SAMPLE_SIZE = 200
+
+# Codepage detected per (archive path, size, modification time), so every worker
+# process handling part of an archive only detects it once
+_detected_encodings = {}
+MAX_DETECTED_ENCODINGS = 256
+
+
+def raw_name(extension, member):
+    """
+    The member name as the bytes stored in the archive, or None when the library already decoded it correctly
+    """
+    if extension == '.zip':
+        if member.info.flag_bits & ZIP_UTF8_FLAG:
+            return None
+        # zipfile decodes every other name as cp437, which maps all 256 byte values, so this round-trips
+        return member.name.encode('cp437')
+    if extension == '.tar':
+        # tarfile keeps bytes that are not UTF-8 as surrogate escapes
+        try:
+            member.name.encode('utf-8')
+        except UnicodeEncodeError:
+            return member.name.encode('utf-8', 'surrogateescape')
+        return None
+    # unrar and py7zr read the Unicode names stored in the archive
+    return None
+
+
+def _is_natural(char, encoding):
+    """
+    True when the character is one a file name in that codepage would normally contain
+    """
+    code = ord(char)
+    if 0x4E00 <= code <= 0x9FFF:
+        # Korean names are written in Hangul, and Big5 or Korean bytes read as GBK land
+        # outside the common GB2312 characters
+        if encoding == 'euc_kr':
+            return False
+        if encoding == 'gbk':
+            try:
+                char.encode('gb2312')
+            except UnicodeEncodeError:
+                return False
+        return True
+    # Half-width katakana is what Chinese and Korean bytes usually turn into when read as cp932
+    if 0xFF61 <= code <= 0xFF9F:
+        return False
+    return unicodedata.category(char)[0] in 'LNPZ'
+
+
+def _score(samples, encoding):
+    """
+    (share of the names that decode, share of natural characters among the decoded non-ASCII ones)
+    """
+    decoded_count = natural = total = 0
+    for name in samples:
+        try:
+            decoded = name.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+        decoded_count += 1
+        for char in decoded:
+            if ord(char) >= 0x80:
+                total += 1
+                natural += _is_natural(char, encoding)
+    return decoded_count / len(samples), natural / total if total else 0
+
+
+def _common_hangul_share(samples):
+    """
+    Share of the Hangul syllables in the names, read as EUC-KR, that are in COMMON_HANGUL
+    """
+    common = total = 0
+    for name in samples:
+        for char in name.decode('euc_kr', 'ignore'):
+            if 0xAC00 <= ord(char) <= 0xD7A3:
+                total += 1
+                common += char in COMMON_HANGUL
+    return common / total if total else 0
+
+
+def detect_encoding(raw_names):
+    """
+    Best candidate codepage for a sample of the archive's raw names
+    """
+    samples = list(islice((name for name in raw_names if not name.isascii()), SAMPLE_SIZE))
+    if not samples:
+        return CANDIDATE_ENCODINGS[0]
+
+    scores = {}
+    for encoding in CANDIDATE_ENCODINGS:
+        scores[encoding] = _score(samples, encoding)
+        # Valid UTF-8 is very unlikely to happen by accident
+        if encoding == 'utf-8' and scores[encoding][0] >= MIN_DECODED_SHARE:
+            return encoding
+    best_score = max(scores.values())
+    if best_score[0] < MIN_DECODED_SHARE:
+        return FALLBACK_ENCODING
+    best_encodings = [encoding for encoding in CANDIDATE_ENCODINGS if scores[encoding] == best_score]
+    if 'euc_kr' in best_encodings and 'gbk' in best_encodings:
+        return 'euc_kr' if _common_hangul_share(samples) >= MIN_COMMON_HANGUL_SHARE else 'gbk'
+    return best_encodings[0]
+
+
+class FilenameDecoder:
+    """
+    Decodes the member names of one archive with the codepage detected for it
+    """
+
+    def __init__(self, extension, encoding):
+        self.extension = extension
+        self.encoding = encoding
+
+    @classmethod
+    def for_archive(cls, archive, members=None, encoding=None):
+        """
+        Decoder for an open Archive. encoding forces a codepage instead of detecting one.
+        """
+        if encoding is None and archive.extension in ('.zip', '.tar'):
+            stat = os.stat(archive.file_path)
+            key = (os.path.abspath(archive.file_path), stat.st_size, stat.st_mtime_ns)
+            encoding = _detected_encodings.get(key)
+            if encoding is None:
+                if members is None:
+                    members = archive.members()
+                encoding = detect_encoding(raw for raw in (raw_name(archive.extension, member) for member in members)
+                                           if raw is not None)
+                if len(_detected_encodings) >= MAX_DETECTED_ENCODINGS:
+                    _detected_encodings.clear()
+                _detected_encodings[key] = encoding
+        return cls(archive.extension, encoding or CANDIDATE_ENCODINGS[0])
+
+    def decode(self, member):
+        """
+        Real name of the member
+        """
+        raw = raw_name(self.extension, member)
+        if raw is None or raw.isascii():
+            return member.name
+        return raw.decode(self.encoding, 'replace')
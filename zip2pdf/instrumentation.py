@@ -0,0 +1,182 @@
+""" ZIP2PDF timings
+    Opt-in per-stage timings and byte counts for real runs, to see whether
+    decompression, name decoding, disk writes, img2pdf encoding or merging is
+    the bottleneck. Recording is off by default and then costs one attribute
+    check per stage. Turn it on with the ZIP2PDF_TIMINGS environment variable or
+    'python -m zip2pdf --timings timings.json ...'; the totals are written out
+    as JSON when the run ends.
+    Stages may nest (img2pdf reads pages, which prepares them), so each stage's
+    time includes the stages run inside it."""
+
+# required modules
+import json
+import os
+import threading
+import time
+from functools import partial
+
+# Path the timings of a run are written to when set
+TIMINGS_ENV = 'ZIP2PDF_TIMINGS'
+
+# {stage name: [seconds, bytes, calls]} of this process, None while recording is off
+_stages = None
+_lock = threading.Lock()
+
+
+class _Stage:
+    """
+    Times one run of a stage. Set nbytes inside the with block when the size is only known afterwards.
+    """
+
+    __slots__ = ('name', 'nbytes', 'started')
+
+    def __init__(self, name, nbytes):
+        self.name = name
+        self.nbytes = nbytes
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        add(self.name, time.perf_counter() - self.started, self.nbytes)
+
+
+class _NullStage:
+    """
+    Stands in for _Stage while recording is off
+    """
+
+    __slots__ = ('nbytes',)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def enable():
+    """
+    Starts recording in this process, keeping anything already recorded
+    """
+    global _stages  # pylint: disable=global-statement
+    with _lock:
+        if _stages is None:
+            _stages = {}
+
+
+def disable():
+    """
+    Stops recording and forgets what was recorded
+    """
+    global _stages  # pylint: disable=global-statement
+    with _lock:
+        _stages = None
+
+
+def is_enabled():
+    """
+    True while recording
+    """
+    return _stages is not None
+
+
+def stage(name, nbytes=0):
+    """
+    Context manager timing one run of a stage:
+        with instrumentation.stage('write', len(data)):
+            dest.write(data)
+    """
+    if _stages is None:
+        return _NULL_STAGE
+    return _Stage(name, nbytes)
+
+
+def add(name, seconds, nbytes=0, calls=1):
+    """
+    Adds one measurement to a stage's totals
+    """
+    with _lock:
+        if _stages is None:
+            return
+        totals = _stages.setdefault(name, [0.0, 0, 0])
+        totals[0] += seconds
+        totals[1] += nbytes or 0
+        totals[2] += calls
+
+
+def collect():
+    """
+    Returns this process's totals as {stage: [seconds, bytes, calls]} and starts again from zero
+    """
+    global _stages  # pylint: disable=global-statement
+    with _lock:
+        if _stages is None:
+            return {}
+        collected, _stages = _stages, {}
+    return collected
+
+
+def merge(collected):
+    """
+    Adds totals returned by collect(), e.g. from a worker process
+    """
+    for name, (seconds, nbytes, calls) in (collected or {}).items():
+        add(name, seconds, nbytes, calls)
+
+
+def _call_collecting(function, *args, **kwargs):
+    """
+    Runs function inside a worker process and returns (its result, the worker's timings)
+    """
+    enable()
+    collect()
+    result = function(*args, **kwargs)
+    return result, collect()
+
+
+def collecting(function):
+    """
+    Wraps function for a worker process so it also returns what the worker recorded.
+    The caller passes the second item of each result to merge().
+    """
+    return partial(_call_collecting, function)
+
+
+def summary():
+    """
+    Totals so far as {stage: {'seconds', 'bytes', 'calls', 'mb_per_s'}}
+    """
+    with _lock:
+        stages = dict(_stages or {})
+    result = {}
+    for name, (seconds, nbytes, calls) in sorted(stages.items()):
+        result[name] = {
+            'seconds': round(seconds, 6),
+            'bytes': nbytes,
+            'calls': calls,
+            'mb_per_s': round(nbytes / seconds / (1024 * 1024), 3) if nbytes and seconds else None,
+        }
+    return result
+
+
+def export(path, **extra):
+    """
+    Writes the totals as JSON to path, together with any extra keyword values
+    """
+    report = dict(extra)
+    report['stages'] = summary()
+    with open(path, 'w', encoding='utf-8') as report_file:
+        json.dump(report, report_file, indent=2, sort_keys=True)
+
+
+def environment_path():
+    """
+    Timings file asked for through ZIP2PDF_TIMINGS, or None
+    """
+    return os.environ.get(TIMINGS_ENV) or None
@@ -0,0 +1,164 @@
+""" ZIP2PDF merging
+    Combines several PDF files into a single file with pikepdf. Every source
+    stays open until the merged file is saved, because qpdf only reads their
+    page data then; that keeps memory low, but costs one open file per source.
+    Large merges are therefore done in groups of MAX_OPEN_SOURCES through
+    temporary files. Resources that are identical across inputs, such as
+    embedded fonts and repeated images, are written only once."""
+
+# required modules
+import hashlib
+import os
+import tempfile
+
+from zip2pdf import instrumentation
+
+# How deep resource dictionaries are followed when looking for shared objects
+MAX_RESOURCE_DEPTH = 8
+
+# Most sources open at once. Windows' C runtime allows 512 open files per process.
+MAX_OPEN_SOURCES = 256
+
+
+def _fingerprint(obj, memo, active):
+    """
+    Content digest of a PDF object, including everything it refers to.
+    Returns None when the object refers back to itself, as those are never shared.
+    """
+    import pikepdf
+
+    objgen = obj.objgen if isinstance(obj, pikepdf.Object) and obj.is_indirect else None
+    if objgen is not None:
+        if objgen in memo:
+            return memo[objgen]
+        if objgen in active:
+            return None
+        active.add(objgen)
+
+    digest = hashlib.sha256()
+    if isinstance(obj, pikepdf.Stream):
+        digest.update(b'stream')
+        digest.update(hashlib.sha256(obj.read_raw_bytes()).digest())
+        items = [(key, value) for key, value in obj.stream_dict.items() if key != '/Length']
+    elif isinstance(obj, pikepdf.Dictionary):
+        digest.update(b'dict')
+        items = sorted(obj.items())
+    elif isinstance(obj, pikepdf.Array):
+        digest.update(b'array')
+        items = list(enumerate(obj))
+    else:
+        digest.update(obj.unparse() if isinstance(obj, pikepdf.Object) else repr(obj).encode('utf-8'))
+        items = []
+
+    for key, value in items:
+        child = _fingerprint(value, memo, active)
+        if child is None:
+            fingerprint = None
+            break
+        digest.update(str(key).encode('utf-8'))
+        digest.update(child)
+    else:
+        fingerprint = digest.digest()
+
+    if objgen is not None:
+        active.discard(objgen)
+        memo[objgen] = fingerprint
+    return fingerprint
+
+
+def _share_resources(container, shared, depth=0):
+    """
+    Points every indirect object under container at the first identical object seen so far.
+    'shared' holds the state kept across the whole merge.
+    """
+    import pikepdf
+
+    if depth > MAX_RESOURCE_DEPTH:
+        return
+    keys = list(container.keys()) if isinstance(container, pikepdf.Dictionary) else range(len(container))
+    for key in keys:
+        value = container[key]
+        if not isinstance(value, (pikepdf.Dictionary, pikepdf.Array, pikepdf.Stream)):
+            continue
+        if value.is_indirect:
+            if value.objgen in shared['visited']:
+                continue
+            fingerprint = _fingerprint(value, shared['memo'], set())
+            if fingerprint is not None:
+                first = shared['canonical'].setdefault(fingerprint, value)
+                if first.objgen != value.objgen:
+                    container[key] = first
+                    continue
+            shared['visited'].add(value.objgen)
+        _share_resources(value.stream_dict if isinstance(value, pikepdf.Stream) else value, shared, depth + 1)
+
+
+def _merge_in_groups(pdf_paths, output_path, compress, share_resources, progress):
+    """
+    Merges each run of MAX_OPEN_SOURCES sources into a temporary file, then merges those.
+    Identical resources are still shared across groups, as the last merge compares the groups' resources.
+    """
+    with tempfile.TemporaryDirectory(prefix='zip2pdf-merge-') as temp_dir:
+        group_paths = []
+        for start in range(0, len(pdf_paths), MAX_OPEN_SOURCES):
+            group_progress = None
+            if progress is not None:
+                def group_progress(_group_path, done, _total, start=start):
+                    progress(output_path, start + done, len(pdf_paths))
+            group_path = os.path.join(temp_dir, 'group{:05d}.pdf'.format(len(group_paths)))
+            merge_pdfs(pdf_paths[start:start + MAX_OPEN_SOURCES], group_path,
+                       share_resources=share_resources, progress=group_progress)
+            group_paths.append(group_path)
+        merge_pdfs(group_paths, output_path, compress, share_resources)
+
+
+def merge_pdfs(pdf_paths, output_path, compress=False, share_resources=True, progress=None):
+    """
+    Combines the PDF files, in order, into a single file at output_path.
+    pdf_paths may also hold binary file objects.
+    share_resources writes identical fonts and images only once.
+    compress drops unused resources and packs objects into compressed object streams.
+    progress(output_path, done, total) is called as each source's pages are added.
+    More than MAX_OPEN_SOURCES sources are merged in groups first, so the number of open files stays bounded.
+    """
+    import pikepdf
+
+    pdf_paths = list(pdf_paths)
+    if len(pdf_paths) > MAX_OPEN_SOURCES:
+        _merge_in_groups(pdf_paths, output_path, compress, share_resources, progress)
+        return
+
+    final_pdf = pikepdf.Pdf.new()
+    shared = {'memo': {}, 'canonical': {}, 'visited': set()}
+    # Page data is only read from the sources while saving, so they stay open until then
+    sources = []
+    try:
+        for pdf_file in pdf_paths:
+            with instrumentation.stage('merge'):
+                source = pikepdf.open(pdf_file)
+                sources.append(source)
+                first_page = len(final_pdf.pages)
+                final_pdf.pages.extend(source.pages)
+                if share_resources:
+                    for index in range(first_page, len(final_pdf.pages)):
+                        # Newer pikepdf versions wrap the page dictionary in a Page helper
+                        page = final_pdf.pages[index]
+                        resources = getattr(page, 'obj', page).get('/Resources')
+                        if resources is not None:
+                            _share_resources(resources, shared)
+            if progress is not None:
+                progress(output_path, len(sources), len(pdf_paths))
+
+        with instrumentation.stage('merge_save') as timing:
+            if compress:
+                final_pdf.remove_unreferenced_resources()
+                final_pdf.save(output_path, compress_streams=True,
+                               object_stream_mode=pikepdf.ObjectStreamMode.generate)
+            else:
+                final_pdf.save(output_path)
+            if isinstance(output_path, str):
+                timing.nbytes = os.path.getsize(output_path)
+    finally:
+        for source in sources:
+            source.close()
+        final_pdf.close()
@@ -0,0 +1,205 @@
+""" ZIP2PDF page cache
+    Persistent on-disk cache of single-page PDFs, one per converted image, keyed
+    by the image's content hash and the conversion options. Rebuilding the PDF of
+    a folder only converts new or changed images; every other page comes straight
+    from the cache. The cache has a size limit and evicts the least recently used
+    pages first."""
+
+# required modules
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import time
+
+from zip2pdf import instrumentation, merge, prepare
+
+# Default location, can be moved with the ZIP2PDF_CACHE_DIR environment variable
+DEFAULT_CACHE_DIR = os.environ.get('ZIP2PDF_CACHE_DIR') or os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'zip2pdf', 'pages')
+
+# Default size limit of the cached pages
+DEFAULT_CACHE_BYTES = 2 * 1024 * 1024 * 1024
+
+# Chunk size used when hashing image files
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path):
+    """
+    SHA-256 of the file's content, read in chunks
+    """
+    digest = hashlib.sha256()
+    with instrumentation.stage('hash_image', os.path.getsize(path)):
+        with open(path, 'rb') as image_file:
+            for chunk in iter(lambda: image_file.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def assemble_pages(page_pdfs, pdf_path):
+    """
+    Writes the single-page PDFs, given as bytes, one after another into one PDF at pdf_path
+    """
+    # Every page holds a different image, so there is nothing to share between them
+    merge.merge_pdfs([io.BytesIO(page_pdf) for page_pdf in page_pdfs], pdf_path, share_resources=False)
+
+
+class PageCache:
+    """
+    Single-page PDFs stored under cache_dir, with an sqlite index that records
+    page sizes and last use, plus the content hash of each image path seen so
+    unchanged files are not hashed again. Paths are forgotten once no page made from
+    their content is left.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        # Several processes may share one cache, so wait on the lock rather than fail straight away.
+        # The cache may be created on one thread and used from a job thread, one thread at a time.
+        self.db = sqlite3.connect(os.path.join(cache_dir, 'index.sqlite3'), timeout=30, check_same_thread=False)
+        with self.db:
+            self.db.execute('CREATE TABLE IF NOT EXISTS pages '
+                            '(key TEXT PRIMARY KEY, size INTEGER, last_used REAL, digest TEXT)')
+            self.db.execute('CREATE TABLE IF NOT EXISTS sources '
+                            '(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, digest TEXT)')
+            # Pages cached before pages had a digest get the column, left empty
+            columns = [row[1] for row in self.db.execute('PRAGMA table_info(pages)')]
+            if 'digest' not in columns:
+                self.db.execute('ALTER TABLE pages ADD COLUMN digest TEXT')
+            self.db.execute('CREATE INDEX IF NOT EXISTS pages_digest ON pages (digest)')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Closes the index
+        """
+        self.db.close()
+
+    def page_path(self, key):
+        """
+        Location of one cached page, spread over sub-folders to keep folders small
+        """
+        return os.path.join(self.cache_dir, key[:2], key + '.pdf')
+
+    def image_digest(self, path):
+        """
+        Content hash of the image, only recomputed when its size or modification time changed
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        row = self.db.execute('SELECT size, mtime_ns, digest FROM sources WHERE path = ?', (path,)).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+        digest = file_digest(path)
+        with self.db:
+            self.db.execute('INSERT OR REPLACE INTO sources (path, size, mtime_ns, digest) VALUES (?, ?, ?, ?)',
+                            (path, stat.st_size, stat.st_mtime_ns, digest))
+        return digest
+
+    @staticmethod
+    def page_key(digest, options):
+        """
+        Cache key of one page: the image hash, the preparation options and the img2pdf and preparation versions
+        """
+        import img2pdf
+
+        key_source = json.dumps([digest, options, img2pdf.__version__, prepare.PREPARE_VERSION], sort_keys=True)
+        return hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        Returns the cached page PDF, or None when it is not cached
+        """
+        try:
+            with open(self.page_path(key), 'rb') as page_file:
+                return page_file.read()
+        except FileNotFoundError:
+            return None
+
+    def touch(self, keys):
+        """
+        Marks the pages as just used, in one transaction
+        """
+        now = time.time()
+        with self.db:
+            self.db.executemany('UPDATE pages SET last_used = ? WHERE key = ?', [(now, key) for key in keys])
+
+    def put(self, key, page_pdf, digest=None):
+        """
+        Stores a page PDF. It is written to a temporary file first so readers never see half a page.
+        digest is the content hash of the image it was made from, which keeps that image's path known.
+        """
+        page_path = self.page_path(key)
+        os.makedirs(os.path.dirname(page_path), exist_ok=True)
+        temp_path = '{}.{}.tmp'.format(page_path, os.getpid())
+        with open(temp_path, 'wb') as page_file:
+            page_file.write(page_pdf)
+        os.replace(temp_path, page_path)
+        with self.db:
+            self.db.execute('INSERT OR REPLACE INTO pages (key, size, last_used, digest) VALUES (?, ?, ?, ?)',
+                            (key, len(page_pdf), time.time(), digest))
+
+    def evict(self):
+        """
+        Deletes the least recently used pages until the cache fits in max_bytes,
+        then forgets the image paths whose content has no page left
+        """
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.db.execute('SELECT key, size FROM pages ORDER BY last_used').fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self.page_path(key))
+            except FileNotFoundError:
+                pass
+            evicted.append((key,))
+            total -= size
+        with self.db:
+            self.db.executemany('DELETE FROM pages WHERE key = ?', evicted)
+            self.db.execute('DELETE FROM sources WHERE NOT EXISTS '
+                            '(SELECT 1 FROM pages WHERE pages.digest = sources.digest)')
+
+    def images_to_pdf(self, image_list, pdf_path, options=None, executor=None, progress=None):
+        """
+        Converts the images into a single PDF at pdf_path, reusing every cached page.
+        options are prepare.prepare_page keyword arguments and are part of the cache key.
+        Missing pages are converted in executor's worker processes when one is given.
+        progress(done, total) is called as pages become available.
+        Returns the number of pages written.
+        """
+        options = options or {}
+        digests = [self.image_digest(path) for path in image_list]
+        keys = [self.page_key(digest, options) for digest in digests]
+        page_pdfs = [self.get(key) for key in keys]
+        self.touch([key for key, page_pdf in zip(keys, page_pdfs) if page_pdf is not None])
+
+        missing = [index for index, page_pdf in enumerate(page_pdfs) if page_pdf is None]
+        cached_count = len(page_pdfs) - len(missing)
+
+        def page_progress(done, _total):
+            if progress is not None:
+                progress(cached_count + done, len(page_pdfs))
+
+        page_progress(0, len(missing))
+        converted = prepare.map_pages(prepare.convert_page, [image_list[index] for index in missing],
+                                      options, executor, page_progress)
+        for index, page_pdf in zip(missing, converted):
+            self.put(keys[index], page_pdf, digests[index])
+            page_pdfs[index] = page_pdf
+
+        assemble_pages(page_pdfs, pdf_path)
+        self.evict()
+        return len(page_pdfs)
@@ -0,0 +1,167 @@
+""" ZIP2PDF page preparation
+    Gets each image ready for img2pdf before the PDF is assembled. Images img2pdf
+    cannot embed as they are (transparency, mirrored EXIF orientation, unusual
+    modes) are re-encoded with Pillow, and pages can optionally be downscaled to a
+    target DPI and recompressed as JPEG. Everything else is passed through
+    untouched so img2pdf can embed it losslessly.
+    Pages are independent, so they can be prepared in a process pool and then
+    assembled in order."""
+
+# required modules
+import io
+from functools import partial
+
+from zip2pdf import instrumentation
+
+# Modes img2pdf can embed directly
+EMBEDDABLE_MODES = ('1', 'L', 'RGB', 'CMYK', 'P')
+
+# Transparent pixels are flattened onto this background
+BACKGROUND_COLOR = (255, 255, 255)
+
+# Resolution img2pdf assumes for images that do not record one
+DEFAULT_DPI = 96
+
+# JPEG quality used when a JPEG has to be re-encoded and no quality was asked for
+DEFAULT_JPEG_QUALITY = 90
+
+# EXIF orientations img2pdf can only handle by flipping pixels (mirrored ones)
+MIRRORED_ORIENTATIONS = (2, 4, 5, 7)
+EXIF_ORIENTATION_TAG = 0x0112
+
+# Pages handed to a worker at a time
+PAGES_PER_TASK = 8
+
+# Bump when the output of prepare_page changes, so cached pages are rebuilt
+PREPARE_VERSION = 1
+
+
+def _flatten(image):
+    """
+    Removes the alpha channel by compositing the image onto BACKGROUND_COLOR
+    """
+    from PIL import Image
+
+    if image.mode == 'P':
+        image = image.convert('RGBA')
+    grey = image.mode in ('LA', 'La')
+    image = image.convert('RGBA')
+    background = Image.new('RGB', image.size, BACKGROUND_COLOR)
+    background.paste(image, mask=image.getchannel('A'))
+    return background.convert('L') if grey else background
+
+
+def _has_alpha(image):
+    """
+    True when the image carries transparency img2pdf would refuse
+    """
+    return image.mode in ('RGBA', 'LA', 'La', 'RGBa', 'PA') or 'transparency' in image.info
+
+
+def prepare_page(image, target_dpi=None, jpeg_quality=None):
+    """
+    Returns image data img2pdf can embed. image is a file path or the image bytes.
+    With target_dpi, images above that resolution are downscaled while keeping their page size.
+    With jpeg_quality, re-encoded pages are saved as JPEG at that quality.
+    """
+    if isinstance(image, str):
+        with instrumentation.stage('read_image') as timing:
+            with open(image, 'rb') as image_file:
+                image = image_file.read()
+            timing.nbytes = len(image)
+
+    with instrumentation.stage('prepare', len(image)):
+        return _prepare_bytes(image, target_dpi, jpeg_quality)
+
+
+def _prepare_bytes(image, target_dpi, jpeg_quality):
+    """
+    prepare_page for image bytes
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(image)) as source:
+        # Multi-page TIFF/GIF are left to img2pdf, which converts every frame
+        if getattr(source, 'n_frames', 1) > 1:
+            return image
+
+        dpi = source.info.get('dpi', (DEFAULT_DPI, DEFAULT_DPI))
+        dpi = (float(dpi[0]) or DEFAULT_DPI, float(dpi[1]) or DEFAULT_DPI)
+        orientation = source.getexif().get(EXIF_ORIENTATION_TAG, 1)
+        downscale = target_dpi is not None and max(dpi) > target_dpi
+        needs_work = (downscale or jpeg_quality is not None or _has_alpha(source)
+                      or source.mode not in EMBEDDABLE_MODES or orientation in MIRRORED_ORIENTATIONS)
+        if not needs_work:
+            return image
+
+        source_format = source.format
+        # The EXIF data is dropped on re-encoding, so the orientation is applied to the pixels
+        page = ImageOps.exif_transpose(source)
+        if orientation in (5, 6, 7, 8):
+            dpi = (dpi[1], dpi[0])
+
+        if _has_alpha(page):
+            page = _flatten(page)
+        elif page.mode not in EMBEDDABLE_MODES:
+            page = page.convert('RGB')
+
+        if downscale:
+            scale = target_dpi / max(dpi)
+            page = page.resize((max(1, round(page.width * scale)), max(1, round(page.height * scale))),
+                               Image.LANCZOS)
+            dpi = (dpi[0] * scale, dpi[1] * scale)
+
+        output = io.BytesIO()
+        if jpeg_quality is not None or source_format == 'JPEG':
+            if page.mode in ('1', 'P'):
+                page = page.convert('L' if page.mode == '1' else 'RGB')
+            page.save(output, 'JPEG', quality=jpeg_quality or DEFAULT_JPEG_QUALITY, dpi=dpi)
+        else:
+            page.save(output, 'PNG', dpi=dpi)
+        return output.getvalue()
+
+
+def convert_page(image, target_dpi=None, jpeg_quality=None):
+    """
+    Prepares one image and converts it to a single-page PDF
+    """
+    # Image to PDF libraries
+    import img2pdf
+
+    page = prepare_page(image, target_dpi, jpeg_quality)
+    with instrumentation.stage('img2pdf', len(page)):
+        return img2pdf.convert(page)
+
+
+def map_pages(function, images, options=None, executor=None, progress=None):
+    """
+    Runs function(image, **options) for every image and returns the results in order.
+    The pages are spread over executor's worker processes when one is given.
+    progress(done, total) is called after each page.
+    """
+    function = partial(function, **(options or {}))
+    images = list(images)
+    # With timings on, the workers send back what they recorded along with each page
+    timed = executor is not None and instrumentation.is_enabled()
+    if executor is None:
+        results = (function(image) for image in images)
+    elif timed:
+        results = executor.map(instrumentation.collecting(function), images, chunksize=PAGES_PER_TASK)
+    else:
+        results = executor.map(function, images, chunksize=PAGES_PER_TASK)
+
+    pages = []
+    try:
+        for page in results:
+            if timed:
+                page, timings = page
+                instrumentation.merge(timings)
+            pages.append(page)
+            if progress is not None:
+                progress(len(pages), len(images))
+    finally:
+        # Closing executor.map's iterator cancels the pages not yet started,
+        # so a failed or cancelled run does not wait for them
+        if executor is not None:
+            results.close()
+    return pages
@@ -0,0 +1,179 @@
+""" ZIP2PDF job scheduler
+    Runs long jobs on background threads so the caller (the GUI) never blocks.
+    Every kind of work gets its own lane: jobs of one kind run one after another
+    in submission order, while different kinds (extraction and PDF assembly)
+    overlap. Jobs report progress as they go and can be cancelled, whether they
+    are still queued or already running."""
+
+# required modules
+import itertools
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+# Lane of each job kind and how many of its jobs may run at once
+DEFAULT_LANES = {
+    'extract': 1,
+    'pdf': 1,
+}
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a running job once it has been cancelled
+    """
+
+
+class Job:
+    """
+    One unit of work and its progress.
+    The job's function reports through progress(item, done, total), where done and
+    total count the steps within one item (an archive, an output PDF); the job's
+    overall progress adds all of its items up.
+    """
+
+    def __init__(self, job_id, kind, description):
+        self.job_id = job_id
+        self.kind = kind
+        self.description = description
+        self.status = QUEUED
+        self.error = None
+        self.started = None
+        self.finished = None
+        self.future = None
+        self._items = {}
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancel_requested(self):
+        """
+        True once cancel() was called
+        """
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        """
+        Asks the job to stop. A queued job never starts; a running one stops at its next progress report.
+        """
+        self._cancel_event.set()
+        if self.future is not None and self.future.cancel():
+            self.status = CANCELLED
+            self.finished = time.time()
+
+    def progress(self, item, done, total):
+        """
+        Progress callback handed to the job's function. Raises JobCancelled once the job is cancelled.
+        """
+        self._items[item] = (done, total)
+        if self.cancel_requested:
+            raise JobCancelled()
+
+    @property
+    def counts(self):
+        """
+        (steps done, total steps) over all of the job's items
+        """
+        items = list(self._items.values())
+        return sum(done for done, _total in items), sum(total for _done, total in items)
+
+    @property
+    def fraction(self):
+        """
+        Share of the job done, between 0 and 1
+        """
+        if self.status == DONE:
+            return 1.0
+        done, total = self.counts
+        return done / total if total else 0.0
+
+    @property
+    def throughput(self):
+        """
+        Steps done per second while the job ran
+        """
+        if self.started is None:
+            return 0.0
+        elapsed = (self.finished or time.time()) - self.started
+        return self.counts[0] / elapsed if elapsed > 0 else 0.0
+
+
+class JobScheduler:
+    """
+    Queues jobs into one lane per kind and runs them on background threads
+    """
+
+    def __init__(self, lanes=None):
+        lanes = lanes or DEFAULT_LANES
+        self.executors = {kind: ThreadPoolExecutor(max_workers=workers, thread_name_prefix='zip2pdf-' + kind)
+                          for kind, workers in lanes.items()}
+        self.jobs = []
+        self._job_ids = itertools.count(1)
+
+    def submit(self, kind, description, function, *args, **kwargs):
+        """
+        Queues function(*args, progress=job.progress, **kwargs) in the lane for kind and returns its Job
+        """
+        job = Job(next(self._job_ids), kind, description)
+        self.jobs.append(job)
+        job.future = self.executors[kind].submit(self._run, job, function, args, kwargs)
+        return job
+
+    @staticmethod
+    def _run(job, function, args, kwargs):
+        """
+        Runs one job on its lane's thread, recording how it ended
+        """
+        if job.cancel_requested:
+            job.status = CANCELLED
+            return
+        job.status = RUNNING
+        job.started = time.time()
+        try:
+            function(*args, progress=job.progress, **kwargs)
+        except (JobCancelled, CancelledError):
+            job.status = CANCELLED
+        except Exception as exc:  # pylint: disable=broad-except
+            job.error = exc
+            job.status = FAILED
+        else:
+            job.status = DONE
+        finally:
+            job.finished = time.time()
+
+    def job(self, job_id):
+        """
+        Returns the job with that id
+        """
+        for job in self.jobs:
+            if job.job_id == job_id:
+                return job
+        raise KeyError(job_id)
+
+    def cancel(self, job_id):
+        """
+        Cancels the job with that id
+        """
+        self.job(job_id).cancel()
+
+    def clear_finished(self):
+        """
+        Forgets the jobs that are no longer queued or running
+        """
+        self.jobs = [job for job in self.jobs if job.status not in FINISHED_STATES]
+
+    def shutdown(self, wait=True):
+        """
+        Cancels every job. With wait, also waits for the running ones to stop.
+        """
+        for job in self.jobs:
+            job.cancel()
+        for executor in self.executors.values():
+            executor.shutdown(wait=wait)